@@ -0,0 +1,43 @@
+"""Sum of squares of the even numbers of a range: with a loop reading each element of an array, and with
+operators and a reduction applied to whole arrays.
+
+    python -m benchmarks.arrays [elements]
+"""
+import sys
+
+from benchmarks.suite import run_program
+from src.interpreter import Interpreter
+from src.vm import VM
+
+
+ELEMENT_LOOP = """\
+let values = range(0, {elements})
+let total = 0
+for i in 0..len(values):
+    let value = values[i]
+    if value % 2 == 0:
+        total = total + value * value
+"""
+
+VECTORIZED = """\
+let values = range(0, {elements})
+let total = sum(values * values * (values % 2 == 0))
+"""
+
+
+def main():
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print(f"{elements} elements")
+    for engine in (Interpreter, VM):
+        loop_elapsed, loop_variables = run_program(engine, ELEMENT_LOOP.format(elements=elements))
+        vector_elapsed, vector_variables = run_program(engine, VECTORIZED.format(elements=elements))
+        if loop_variables != vector_variables:
+            sys.exit("Both programs should give the same sum")
+        print(
+            f"    {engine.__name__:<11} loop {loop_elapsed:.3f}s, arrays {vector_elapsed:.3f}s "
+            f"({loop_elapsed / vector_elapsed:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Guard heavy code: cheap tests protecting expensive ones, in `and`/`or` and if/elif chains.
+
+The same loop is written twice: with the guards as they would be written, and with every operand and
+condition computed first, which is what running it used to cost.
+
+    python -m benchmarks.guards [iterations]
+"""
+import sys
+
+from benchmarks.suite import run_program
+from src.interpreter import Interpreter
+from src.vm import VM
+
+
+EXPENSIVE = """\
+let checks = 0
+fn expensive(n):
+    checks = checks + 1
+    let i = 0
+    while i < 20:
+        i = i + 1
+    return n % 7 == 0
+let found = 0
+let i = 0
+"""
+
+SHORT_CIRCUIT = """\
+while i < {iterations}:
+    if i % 2 == 0 and expensive(i):
+        found = found + 1
+    elif i % 3 == 0 or expensive(i + 1):
+        found = found + 2
+    else:
+        found = found + 3
+    i = i + 1
+"""
+
+EVERYTHING_COMPUTED = """\
+while i < {iterations}:
+    let first = i % 2 == 0
+    let second = expensive(i)
+    let third = i % 3 == 0
+    let fourth = expensive(i + 1)
+    if first and second:
+        found = found + 1
+    elif third or fourth:
+        found = found + 2
+    else:
+        found = found + 3
+    i = i + 1
+"""
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(f"{iterations} iterations, 4 guards each")
+    for engine in (Interpreter, VM):
+        print(f"    {engine.__name__}")
+        results = {}
+        for label, loop in (("computing everything", EVERYTHING_COMPUTED), ("short-circuit", SHORT_CIRCUIT)):
+            elapsed, results[label] = run_program(engine, EXPENSIVE + loop.format(iterations=iterations), ("found", "checks"))
+            print(f"        {label:<21} {elapsed:.3f}s, expensive() ran {results[label]['checks']} times")
+        if results["computing everything"]["found"] != results["short-circuit"]["found"]:
+            sys.exit("Both loops should find the same thing")
+
+
+if __name__ == "__main__":
+    main()
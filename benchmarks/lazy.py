@@ -0,0 +1,63 @@
+"""Startup of a script calling a few functions of a large generated library, with and without lazy parsing.
+
+    python -m benchmarks.lazy [functions in the library]
+"""
+import sys
+import time
+import tracemalloc
+
+from benchmarks.lexer import GENERATED
+from src.interpreter import Interpreter
+from src.parser import Parser
+from src.scanner import Scanner
+
+
+# Functions of the library the script actually calls
+CALLED = 10
+
+
+def script(count):
+    library = "".join(GENERATED.format(n=n) for n in range(count))
+    calls = "".join(
+        f"let balance_{i} = compute_adjusted_balance_for_account_{n}(1000, 5, 10)\n"
+        for i, n in enumerate(range(0, count, max(count // CALLED, 1)))
+    )
+    return library + calls
+
+
+def run(source, lazy):
+    interpreter = Interpreter()
+    interpreter.run(Parser(Scanner(source), lazy=lazy).parse())
+    return interpreter
+
+
+def measure(source, lazy):
+    """Time and peak memory to parse and run `source`, and the variables it ends with."""
+    start = time.perf_counter()
+    run(source, lazy)
+    elapsed = time.perf_counter() - start
+    # Measured apart, tracemalloc slows everything down
+    tracemalloc.start()
+    interpreter = run(source, lazy)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    variables = {name: interpreter.globals.values[slot] for name, slot in interpreter.resolver.globals.items()}
+    return elapsed, peak, {name: value for name, value in variables.items() if name.startswith("balance_")}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    source = script(count)
+    print(f"{count} functions, {CALLED} called, {len(source) / 1024 / 1024:.1f} MB of source")
+
+    results = {}
+    for lazy in (False, True):
+        elapsed, peak, results[lazy] = measure(source, lazy)
+        label = "lazy" if lazy else "eager"
+        print(f"    {label:<6} {elapsed:.3f}s, peak memory {peak / 1024 / 1024:.1f} MB")
+    if results[False] != results[True]:
+        sys.exit("The script doesn't give the same results when parsed lazily")
+
+
+if __name__ == "__main__":
+    main()
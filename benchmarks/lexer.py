@@ -0,0 +1,93 @@
+"""Compares the Lexer and the Scanner on a generated source of a few megabytes.
+
+    python -m benchmarks.lexer [size in MB]
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from src.lexer import Lexer
+from src.scanner import Scanner
+from src.token import *
+
+
+EXAMPLES = Path(__file__).parent.parent / "examples" / "tests"
+
+
+# Looks like generated code: long names, literals and comments
+GENERATED = """\
+// Generated from the accounting_rules table, do not edit
+fn compute_adjusted_balance_for_account_{n}(previous_balance, interest_rate_percent, monthly_fee):
+    let adjusted_balance_{n} = previous_balance * (100.0 + interest_rate_percent) / 100.0 - monthly_fee
+    if adjusted_balance_{n} < 0:
+        print("Account {n} would be overdrawn after applying the monthly fee and interest")
+    return adjusted_balance_{n}
+
+"""
+
+
+def generate(size, generated=False):
+    """Repeat the test programs (or some generated looking code) until the source is `size` characters long."""
+    if generated:
+        sample = "".join(GENERATED.format(n=n) for n in range(1000))
+    else:
+        sample = "\n".join(path.read_text() for path in sorted(EXAMPLES.iterdir())) + "\n"
+    return sample * (size // len(sample) + 1)
+
+
+def tokens(lexer):
+    result = []
+    while True:
+        token = lexer.get_next_token()
+        result.append((token.type, token.value, token.line, token.column))
+        if token.type == EOF:
+            return result
+
+
+def measure(lexer_class, source):
+    lexer = lexer_class(source)
+    start = time.perf_counter()
+    while lexer.get_next_token().type != EOF:
+        pass
+    return time.perf_counter() - start
+
+
+def peak_memory(path, streaming):
+    """Peak memory while tokenizing the file, read at once or as the tokens are asked for."""
+    tracemalloc.start()
+    with open(path) as f:
+        lexer = Scanner(f) if streaming else Scanner(f.read())
+        while lexer.get_next_token().type != EOF:
+            pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    for name, generated in (("examples/tests", False), ("generated", True)):
+        source = generate(int(size * 1024 * 1024), generated)
+        print(f"{name}: {len(source) / 1024 / 1024:.1f} MB, {source.count(chr(10))} lines")
+
+        if tokens(Lexer(source)) != tokens(Scanner(source)):
+            sys.exit("The Scanner and the Lexer don't return the same tokens")
+
+        results = {}
+        for lexer_class in (Lexer, Scanner):
+            results[lexer_class] = min(measure(lexer_class, source) for _ in range(3))
+            print(f"    {lexer_class.__name__:<8} {results[lexer_class]:.3f}s")
+        print(f"    Speedup: {results[Lexer] / results[Scanner]:.1f}x")
+
+        with tempfile.NamedTemporaryFile("w", suffix=".huil") as f:
+            f.write(source)
+            f.flush()
+            for streaming in (False, True):
+                label = "streamed" if streaming else "read at once"
+                print(f"    Peak memory, {label}: {peak_memory(f.name, streaming) / 1024 / 1024:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
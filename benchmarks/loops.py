@@ -0,0 +1,45 @@
+"""Counting loops: the same sum with a while loop updating its counter, and with a for loop over a range.
+
+    python -m benchmarks.loops [iterations]
+"""
+import sys
+
+from benchmarks.suite import run_program
+from src.interpreter import Interpreter
+from src.vm import VM
+
+
+WHILE_LOOP = """\
+fn sum(n):
+    let total = 0
+    let i = 0
+    while i != n:
+        total = total + i
+        i = i + 1
+    return total
+let total = sum({iterations})
+"""
+
+FOR_LOOP = """\
+fn sum(n):
+    let total = 0
+    for i in 0..n:
+        total = total + i
+    return total
+let total = sum({iterations})
+"""
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"{iterations} iterations")
+    for engine in (Interpreter, VM):
+        while_elapsed, while_variables = run_program(engine, WHILE_LOOP.format(iterations=iterations))
+        for_elapsed, for_variables = run_program(engine, FOR_LOOP.format(iterations=iterations))
+        if while_variables != for_variables:
+            sys.exit("Both loops should give the same sum")
+        print(f"    {engine.__name__:<11} while {while_elapsed:.3f}s, for {for_elapsed:.3f}s ({while_elapsed / for_elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
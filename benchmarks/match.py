@@ -0,0 +1,50 @@
+"""Dispatch on a value with match, depending on the number of arms. Literal patterns are looked up in a table,
+other ones are still compared one by one: the same match is run with its patterns stored in variables.
+
+    python -m benchmarks.match [calls]
+"""
+import sys
+
+from benchmarks.suite import run_program
+from src.interpreter import Interpreter
+from src.vm import VM
+
+
+ARMS = (5, 50, 200)
+
+PROGRAM = """\
+{variables}
+fn route(n):
+    return match n:
+{arms}
+        | * -> -1
+let i = 0
+let total = 0
+while i < {calls}:
+    total = total + route(i % {count})
+    i = i + 1
+"""
+
+
+def program(count, calls, literal):
+    variables = "\n".join(f"let pattern_{n} = {n}" for n in range(count))
+    pattern = "{}" if literal else "pattern_{}"
+    arms = "\n".join(f"        | {pattern.format(n)} -> {n * 2}" for n in range(count))
+    return PROGRAM.format(variables=variables, arms=arms, calls=calls, count=count)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f"{calls} calls")
+    for engine in (Interpreter, VM):
+        print(f"    {engine.__name__}")
+        for count in ARMS:
+            linear, linear_variables = run_program(engine, program(count, calls, literal=False))
+            table, table_variables = run_program(engine, program(count, calls, literal=True))
+            if linear_variables != table_variables:
+                sys.exit("Both matches should give the same result")
+            print(f"        {count:>3} arms: variables {linear:.3f}s, literals {table:.3f}s ({linear / table:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
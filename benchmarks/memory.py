@@ -0,0 +1,70 @@
+"""Memory taken by the tree of a large generated script: with nodes and tokens keeping their fields in a
+`__dict__` (as before they had `__slots__`), as they are, and in an Arena.
+
+    python -m benchmarks.memory [size in MB]
+"""
+import gc
+import sys
+import tracemalloc
+from dataclasses import fields
+
+from benchmarks.lexer import generate
+from src.arena import Arena
+from src.ast import ASTNode, count_nodes
+from src.parser import Parser
+from src.scanner import Scanner
+from src.token import Token
+
+# By node class (and Token), a class of the same name without __slots__, whose objects have a __dict__
+_dict_classes = {}
+
+
+def measure(build):
+    """What `build()` returns, and how many bytes it takes."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def with_dict(value):
+    """Copy of the tree `value`, its nodes and tokens with a `__dict__` of their fields rather than slots."""
+    if type(value) is list:
+        return [with_dict(item) for item in value]
+    if not isinstance(value, (ASTNode, Token)):
+        return value
+    cls = type(value)
+    if cls not in _dict_classes:
+        _dict_classes[cls] = type(cls.__name__, (), {})
+    copy = _dict_classes[cls]()
+    # In the order __init__ sets them, objects of a class then share the keys of their __dict__
+    names = [field.name for field in fields(value)] if isinstance(value, ASTNode) else Token.__slots__
+    for name in names:
+        setattr(copy, name, with_dict(getattr(value, name)))
+    return copy
+
+
+def main():
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    source = generate(int(size * 1024 * 1024), generated=True)
+    tree, tree_size = measure(lambda: Parser(Scanner(source)).parse())
+    nodes = count_nodes(tree)
+    print(f"{len(source) / 1024 / 1024:.1f} MB of source, {nodes} nodes")
+
+    # Only the copy is left once it is built
+    _, dict_size = measure(lambda: with_dict(Parser(Scanner(source)).parse()))
+    print(f"Tree with __dict__ (before): {dict_size / 1024 / 1024:.1f} MB, {dict_size / nodes:.0f} bytes per node")
+    print(f"Tree with __slots__: {tree_size / 1024 / 1024:.1f} MB, {tree_size / nodes:.0f} bytes per node")
+
+    # The tree is thrown away once the arena is built, only the arena is measured
+    arena, arena_size = measure(lambda: Arena.from_tree(Parser(Scanner(source)).parse()))
+    print(f"Arena: {arena_size / 1024 / 1024:.1f} MB, {arena_size / nodes:.0f} bytes per node")
+    if repr(arena.tree()) != repr(tree):
+        sys.exit("The tree rebuilt from the arena isn't the same")
+
+
+if __name__ == "__main__":
+    main()
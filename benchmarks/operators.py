@@ -0,0 +1,51 @@
+"""Cost of each operator on its own, on the checked path (no TypeInference) where operators are quickened
+for the operand types they see. Each loop runs the operation 10 times, the cost of the loop around them is
+measured apart and taken out, and the best of 3 runs is kept.
+
+    python -m benchmarks.operators [iterations]
+"""
+import sys
+
+from benchmarks.suite import run_program
+from src.interpreter import Interpreter
+from src.vm import VM
+
+
+OPERATIONS = ["a + b", "a - b", "a * b", "a / b", "a % b", "a < b", "a <= b", "a == b", "-a", "!t"]
+
+PROGRAM = """\
+let a = {a}
+let b = {b}
+let t = true
+let r = a
+let i = 0
+while i < {iterations}:
+{body}
+    i = i + 1
+"""
+
+# Operations per loop iteration
+REPEAT = 10
+
+
+def measure(engine, a, b, iterations, operation):
+    source = PROGRAM.format(a=a, b=b, iterations=iterations, body="\n".join([f"    r = {operation}"] * REPEAT))
+    return min(run_program(engine, source, (), infer=False)[0] for _ in range(3))
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(f"{iterations} iterations, ns per operation")
+    for engine in (Interpreter, VM):
+        print(f"    {engine.__name__}")
+        for a, b in (("7", "3"), ("7.5", "3.5")):
+            empty = measure(engine, a, b, iterations, "a")
+            costs = []
+            for operation in OPERATIONS:
+                elapsed = measure(engine, a, b, iterations, operation)
+                costs.append(f"{operation} {(elapsed - empty) / iterations / REPEAT * 1e9:.0f}")
+            print(f"        {'floats' if '.' in a else 'ints':<7} " + ", ".join(costs))
+
+
+if __name__ == "__main__":
+    main()
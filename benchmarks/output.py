@@ -0,0 +1,41 @@
+"""Throughput of `print` with each output sink, writing to /dev/null: rich (the REPL's), plain text written
+line by line, buffered plain text (the default for files) and kept in memory. rich only runs 1% of the prints,
+it would take minutes otherwise.
+
+    python -m benchmarks.output [prints]
+"""
+import contextlib
+import os
+import sys
+
+from benchmarks.suite import run_program
+from src.output import CaptureOutput, RichOutput, StreamOutput
+from src.vm import VM
+
+
+PROGRAM = """\
+for i in 0..{prints}:
+    print(i)
+"""
+
+
+def main():
+    prints = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print(f"{prints} prints, on the VM")
+    with open(os.devnull, "w") as devnull:
+        sinks = {
+            "rich": RichOutput(),
+            "unbuffered": StreamOutput(devnull, buffer_size=0),
+            "buffered": StreamOutput(devnull),
+            "capture": CaptureOutput(),
+        }
+        for name, output in sinks.items():
+            count = max(prints // 100, 1) if name == "rich" else prints
+            # rich writes to sys.stdout
+            with contextlib.redirect_stdout(devnull):
+                elapsed = run_program(VM, PROGRAM.format(prints=count), (), output=output)[0]
+            print(f"    {name:<11} {count} prints in {elapsed:.3f}s, {count / elapsed:,.0f} prints/s")
+
+
+if __name__ == "__main__":
+    main()
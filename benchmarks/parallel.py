@@ -0,0 +1,53 @@
+"""Collatz steps of each number of a range, with `pmap` running in the calling process and on a worker per
+core, and summed with `preduce` the same ways.
+
+    python -m benchmarks.parallel [numbers]
+"""
+import sys
+
+from benchmarks.suite import run_program
+from src import parallel
+from src.vm import VM
+
+
+PROGRAM = """\
+fn steps(n):
+    let count = 0
+    while n != 1:
+        if n % 2 == 0:
+            n = n / 2
+        else:
+            n = 3 * n + 1
+        count = count + 1
+    return count
+
+fn add(a, b):
+    return a + b
+
+let total = preduce(add, pmap(steps, range(1, {numbers})))
+"""
+
+
+def measure(source, workers):
+    """Time to run `source` with `workers` processes, and its `total` variable."""
+    parallel.WORKERS = workers
+    return run_program(VM, source)
+
+
+def main():
+    numbers = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = parallel.WORKERS
+    print(f"{numbers} numbers, on the VM")
+    source = PROGRAM.format(numbers=numbers)
+    serial_elapsed, serial_variables = measure(source, 1)
+    parallel_elapsed, parallel_variables = measure(source, workers)
+    if serial_variables != parallel_variables:
+        sys.exit("Both runs should give the same total")
+    print(
+        f"    1 worker {serial_elapsed:.3f}s, {workers} workers {parallel_elapsed:.3f}s "
+        f"({serial_elapsed / parallel_elapsed:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Building a string by appending (and by prepending) to it in a loop, with `+` making a Rope (joined once, when
+the string is printed or given to a builtin), and with `+` copying the whole string at each step as a plain
+`str` concatenation would.
+
+    python -m benchmarks.strings [appends]
+"""
+import operator
+import sys
+
+from benchmarks.suite import run_program
+from src.interpreter import Interpreter
+from src.rope import STRING_OPERATIONS, concat
+from src.tokens import PLUS
+from src.vm import VM
+
+
+PROGRAMS = {
+    "appends": """\
+let text = ""
+for i in 0..{appends}:
+    text = text + "word "
+let size = len(text)
+""",
+    "prepends": """\
+let text = ""
+for i in 0..{appends}:
+    text = "word " + text
+let size = len(text)
+""",
+}
+
+
+def measure(engine, source, concatenation):
+    """Time to run `source` with `concatenation` as the `+` of strings, and its `size` variable."""
+    STRING_OPERATIONS[PLUS] = concatenation
+    try:
+        return run_program(engine, source, ("size",))
+    finally:
+        STRING_OPERATIONS[PLUS] = concat
+
+
+def main():
+    appends = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, program in PROGRAMS.items():
+        source = program.format(appends=appends)
+        print(f"{appends} {name}")
+        for engine in (Interpreter, VM):
+            naive_elapsed, naive_variables = measure(engine, source, operator.add)
+            rope_elapsed, rope_variables = measure(engine, source, concat)
+            if naive_variables != rope_variables:
+                sys.exit("Both runs should build the same string")
+            print(
+                f"    {engine.__name__:<11} copying {naive_elapsed:.3f}s, rope {rope_elapsed:.3f}s "
+                f"({naive_elapsed / rope_elapsed:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Benchmark suite: the programs of benchmarks/programs and a large generated source, run on each engine.
+
+Each program is lexed, parsed (lexing included, the Parser pulls its tokens from the Scanner) and executed
+`repeat` times, timings are reported as mean ± standard deviation. The peak memory of parsing and executing it
+is measured in one more run, apart (tracemalloc slows everything down). Results can be stored as JSON and
+compared with the ones of another commit or engine.
+
+The benchmarks of each feature (benchmarks/arrays.py, loops.py...) run their programs with `run_program`.
+
+    python -m benchmarks.suite [--engine tree] [--repeat 5] [--output results.json] [--compare old.json] [names]
+    python main.py --bench [--bench-output results.json] [--bench-compare old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.lexer import GENERATED
+from src.output import StreamOutput
+from src.parser import Parser
+from src.scanner import Scanner
+from src.token import *
+from src.vm import ENGINES
+
+
+PROGRAMS = Path(__file__).parent / "programs"
+
+
+def programs():
+    """Source of each program, by name."""
+    sources = {path.stem: path.read_text() for path in sorted(PROGRAMS.glob("*.huil"))}
+    # Lexer and parser throughput: a few thousand functions which are declared but never called
+    sources["generated"] = "".join(GENERATED.format(n=n) for n in range(3000))
+    return sources
+
+
+def lex(source):
+    scanner = Scanner(source)
+    while scanner.get_next_token().type != EOF:
+        pass
+
+
+def execute(engine, tree, output=None, **options):
+    """Run `tree` on a new `engine(**options)`, and return the interpreter."""
+    interpreter = engine(output=output, **options)
+    interpreter.run(tree)
+    return interpreter
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_program(engine, source, names=("total",), **options):
+    """Parse `source` and run it on a new `engine(**options)`: the time the run took (parsing left out), and the
+    global variables `names` it ends with, by name."""
+    tree = Parser(Scanner(source)).parse()
+    elapsed, interpreter = timed(execute, engine, tree, **options)
+    return elapsed, {name: interpreter.globals.values[interpreter.resolver.globals[name]] for name in names}
+
+
+def summary(timings):
+    return {
+        "mean": statistics.mean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "min": min(timings),
+        "runs": timings,
+    }
+
+
+def peak_memory(engine, source, output):
+    tracemalloc.start()
+    try:
+        execute(engine, Parser(Scanner(source)).parse(), output)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(source, engines, repeat, output):
+    """Timings of each phase of a program, the execution on each engine."""
+    result = {"size": len(source), "lines": source.count("\n")}
+    lex_timings = []
+    parse_timings = []
+    execute_timings = {engine: [] for engine in engines}
+    for _ in range(repeat):
+        lex_timings.append(timed(lex, source)[0])
+        for engine in engines:
+            # The tree is parsed again for each run, operators remember what they ran on (see Interpreter)
+            elapsed, tree = timed(Parser(Scanner(source)).parse)
+            parse_timings.append(elapsed)
+            execute_timings[engine].append(timed(execute, ENGINES[engine], tree, output)[0])
+    result["lex"] = summary(lex_timings)
+    result["parse"] = summary(parse_timings)
+    result["engines"] = {}
+    for engine in engines:
+        result["engines"][engine] = {
+            "execute": summary(execute_timings[engine]),
+            "peak_memory": peak_memory(ENGINES[engine], source, output),
+        }
+    return result
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(engines=tuple(ENGINES), repeat=5, names=None, log=print):
+    """Run the suite and return its results, as stored in JSON."""
+    results = {
+        "commit": commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "programs": {},
+    }
+    # What the programs print is thrown away, but still goes through the default output
+    with open(os.devnull, "w") as devnull:
+        for name, source in programs().items():
+            if names and name not in names:
+                continue
+            result = results["programs"][name] = measure(source, engines, repeat, StreamOutput(devnull))
+            log(report(name, result))
+    return results
+
+
+def milliseconds(stats):
+    return f"{stats['mean'] * 1000:9.1f} ± {stats['stdev'] * 1000:6.1f} ms"
+
+
+def report(name, result):
+    lines = [f"{name} ({result['lines']} lines)"]
+    lines.append(f"    {'lex':<12} {milliseconds(result['lex'])}")
+    lines.append(f"    {'parse':<12} {milliseconds(result['parse'])}")
+    for engine, engine_result in result["engines"].items():
+        peak = engine_result["peak_memory"] / 1024 / 1024
+        execute = milliseconds(engine_result["execute"])
+        lines.append(f"    {'execute ' + engine:<12} {execute}, peak memory {peak:.1f} MB")
+    return "\n".join(lines)
+
+
+def compare(previous, current):
+    """Ratio of the mean timings of the previous results to the current ones, above 1 when it got faster."""
+    lines = [f"Compared with {previous.get('commit')} ({previous.get('date')}), above 1 is faster now"]
+    for name, result in current["programs"].items():
+        before = previous["programs"].get(name)
+        if before is None:
+            continue
+        ratios = []
+        for phase in ("lex", "parse"):
+            ratios.append(f"{phase} {before[phase]['mean'] / result[phase]['mean']:.2f}x")
+        for engine, engine_result in result["engines"].items():
+            if engine in before["engines"]:
+                ratio = before["engines"][engine]["execute"]["mean"] / engine_result["execute"]["mean"]
+                ratios.append(f"{engine} {ratio:.2f}x")
+        lines.append(f"    {name:<12} " + ", ".join(ratios))
+    return "\n".join(lines)
+
+
+def bench(engines, repeat, names, output=None, previous=None):
+    results = run_suite(engines, repeat, names)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    if previous:
+        with open(previous) as f:
+            print(compare(json.load(f), results))
+
+
+def main(args=None):
+    arg_parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    arg_parser.add_argument("names", nargs="*", help="programs to run (default: all of them)")
+    arg_parser.add_argument("--engine", choices=ENGINES, action="append", help="engine to run (default: all)")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="runs of each program (default 5)")
+    arg_parser.add_argument("--output", help="JSON file to store the results in")
+    arg_parser.add_argument("--compare", help="JSON file of previous results to compare with")
+    options = arg_parser.parse_args(args)
+    bench(options.engine or tuple(ENGINES), options.repeat, options.names, options.output, options.compare)
+
+
+if __name__ == "__main__":
+    main()
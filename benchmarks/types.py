@@ -0,0 +1,45 @@
+"""Numeric loops, with and without the operand checks the TypeInference proves unneeded.
+
+    python -m benchmarks.types [iterations]
+"""
+import sys
+
+from benchmarks.suite import run_program
+from src.interpreter import Interpreter
+from src.vm import VM
+
+
+PROGRAM = """\
+fn collatz_steps(n):
+    let steps = 0
+    while n != 1:
+        if n % 2 == 0:
+            n = n / 2
+        else:
+            n = 3 * n + 1
+        steps = steps + 1
+    return steps
+let i = 1
+let total = 0
+let ratio = 0.0
+while i < {iterations}:
+    total = total + collatz_steps(i)
+    ratio = ratio + i * 0.5 - total / i
+    i = i + 1
+"""
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    source = PROGRAM.format(iterations=iterations)
+    print(f"{iterations} iterations")
+    for engine in (Interpreter, VM):
+        checked, checked_variables = run_program(engine, source, infer=False)
+        inferred, inferred_variables = run_program(engine, source, infer=True)
+        if checked_variables != inferred_variables:
+            sys.exit("Both runs should give the same result")
+        print(f"    {engine.__name__:<11} checked {checked:.3f}s, inferred {inferred:.3f}s ({checked / inferred:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
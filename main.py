@@ -1,31 +1,222 @@
 from rich import print
+import argparse
+import contextlib
+import functools
+import gc
+import io
+import json
+import multiprocessing
 import sys
+import time
+from src.ast import count_nodes
+from src.budget import Budget
+from src.cache import Cache
 from src.environment import NameErrorException
 
 from src.interpreter import Interpreter, RuntimeException
-from src.lexer import Lexer
+from src.scanner import Scanner
+from src.optimizer import Optimizer
+from src.output import BUFFER_SIZE, RichOutput, StreamOutput
+from src.profiler import ProfilingInterpreter
 from src.parser import Parser
+from src.vm import ENGINES
 import os
 import readline
 
 histfile_size = 1000
 histfile = "./.history"
 
+TESTS = "examples/tests"
+# What the tests read with `input`
+TEST_INPUT = "5\n"
+# Limits the tests never reach, their checks (and the operators checking allocations) mustn't change anything
+TEST_BUDGET = {"max_steps": 10**8, "timeout": 600.0, "max_depth": 10**6, "max_memory": 4096.0}
+# Each configuration must print what the tree walking interpreter prints, on the tree as parsed
+TEST_CONFIGURATIONS = {
+    "vm": {"engine": "vm"},
+    "tree -O": {"optimize": True},
+    "vm -O": {"engine": "vm", "optimize": True},
+    "tree --lazy": {"lazy": True},
+    "vm --lazy": {"engine": "vm", "lazy": True},
+    "tree with a budget": TEST_BUDGET,
+    "vm with a budget": {"engine": "vm", **TEST_BUDGET},
+}
 
-def run(code):
-    lexer = Lexer(code)
-    parser = Parser(lexer)
-    # print(parser.parse())
-    interpreter = Interpreter()
-    interpreter.interpret(parser)
+def parse(code, options):
+    lexer = Scanner(code)
+    parser = Parser(lexer, lazy=options.lazy)
+    tree = parser.parse()
+    # print(tree)
+    if options.optimize:
+        before = count_nodes(tree)
+        tree = Optimizer().optimize(tree)
+        if options.node_counts:
+            print(f"Nodes: {before} -> {count_nodes(tree)}", file=sys.stderr)
+    return tree
 
 
-def test_file(filename):
+def load(filename, options):
+    """Tree of the file, taken from the cache when the file didn't change since it was last parsed."""
+    if options.no_cache:
+        with open(filename) as f:
+            # The file is tokenized as it is read
+            return parse(f, options)
+
+    cache = Cache()
+    flags = []
+    if options.optimize:
+        flags.append("O")
+    if options.lazy:
+        flags.append("lazy")
+    key = cache.key(filename, flags=flags)
+    tree = cache.get(key)
+    if tree is None:
+        with open(filename) as f:
+            tree = parse(f, options)
+        cache.put(key, tree)
+    return tree
+
+
+def make_interpreter(options, infer=True, output=None):
+    optimizer = Optimizer() if options.optimize else None
+    if output is None:
+        output = StreamOutput(buffer_size=options.output_buffer)
+    engine = ProfilingInterpreter if options.profile else ENGINES[options.engine]
+    budget = None
+    limits = (options.max_steps, options.timeout, options.max_depth, options.max_memory)
+    if any(limit is not None for limit in limits):
+        memory = None if options.max_memory is None else int(options.max_memory * 1024 * 1024)
+        budget = Budget(options.max_steps, options.timeout, options.max_depth, memory)
+    return engine(memo_size=options.memo_size, optimizer=optimizer, infer=infer, output=output, budget=budget)
+
+
+def run(tree, filename, options, output=None):
+    interpreter = make_interpreter(options, output=output)
+    try:
+        interpreter.run(tree)
+    finally:
+        if options.memo_stats:
+            print_memo_stats(interpreter)
+        if options.profile:
+            print_profile(interpreter.profiler, filename, options)
+
+
+def print_profile(profiler, filename, options):
     with open(filename) as f:
-        run(f.read())
+        source = f.read()
+    # Not through rich, the lines of the program could look like markup
+    sys.stderr.write(profiler.report(source) + "\n")
+    if options.profile_stacks:
+        profiler.write_stacks(options.profile_stacks)
+
+
+def print_memo_stats(interpreter):
+    for function in interpreter.memoized:
+        print(f"{function.id}: {function.memo.stats()}", file=sys.stderr)
+
+
+def test_file(filename, options):
+    tree = load(filename, options)
+    # The tree is needed until the end, the garbage collector doesn't need to go through it again and again
+    gc.freeze()
+    run(tree, filename, options)
+
+
+def batch_files(paths):
+    """The files to run for the paths given to -f: the files themselves, and the files under the directories."""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for directory, subdirectories, names in os.walk(path):
+            # Hidden directories (like .huil_cache) aren't programs
+            subdirectories[:] = sorted(name for name in subdirectories if not name.startswith("."))
+            files.extend(os.path.join(directory, name) for name in sorted(names) if not name.startswith("."))
+    return files
 
 
-def repl():
+def run_script(filename, options):
+    """Run one file of a batch, in a worker process: what it printed, and how it went."""
+    stdout = io.StringIO()
+    error = None
+    start = time.perf_counter()
+    try:
+        # Anything else written to stdout (the prompt of `input`) goes with what the program printed
+        with contextlib.redirect_stdout(stdout):
+            run(load(filename, options), filename, options, StreamOutput(stdout))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "file": filename,
+        "status": 0 if error is None else 1,
+        "seconds": time.perf_counter() - start,
+        "stdout": stdout.getvalue(),
+        "error": error,
+    }
+
+
+def run_batch(paths, options):
+    """Run many files on a pool of processes, which share the cache of parsed files, and write a JSON summary of
+    how each one went. Each file gets its own interpreter (and budget), and what it prints is kept apart."""
+    files = batch_files(paths)
+    jobs = options.jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    with multiprocessing.Pool(jobs) as pool:
+        # A few files per task, the order of the files is kept
+        chunk_size = max(1, len(files) // (jobs * 8))
+        scripts = list(pool.imap(functools.partial(run_script, options=options), files, chunk_size))
+    failed = sum(1 for script in scripts if script["status"])
+    summary = {
+        "jobs": jobs,
+        "seconds": time.perf_counter() - start,
+        "passed": len(scripts) - failed,
+        "failed": failed,
+        "scripts": scripts,
+    }
+    if options.summary:
+        with open(options.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        sys.stdout.write(json.dumps(summary, indent=2) + "\n")
+    return failed == 0
+
+
+def run_test(filename, options, **changes):
+    """Run a test with `changes` made to the options, reading TEST_INPUT: what it printed, and how it went."""
+    options = argparse.Namespace(**{**vars(options), **changes, "no_cache": True})
+    stdin = sys.stdin
+    sys.stdin = io.StringIO(TEST_INPUT)
+    try:
+        return run_script(filename, options)
+    finally:
+        sys.stdin = stdin
+
+
+def run_tests(options):
+    """Run the programs of examples/tests on every engine, optimized (-O), parsed lazily (--lazy) and with a
+    budget, and check that each configuration prints what the tree walking interpreter prints, and fails the
+    same way."""
+    files = batch_files([TESTS])
+    differences = 0
+    for filename in files:
+        expected = run_test(filename, options, engine="tree", optimize=False, lazy=False)
+        for name, changes in TEST_CONFIGURATIONS.items():
+            result = run_test(filename, options, **changes)
+            if (result["stdout"], result["error"]) == (expected["stdout"], expected["error"]):
+                continue
+            differences += 1
+            print(f"[red]DIFF[/red] {filename} ({name})", file=sys.stderr)
+            for label, script in (("tree", expected), (name, result)):
+                # Not through rich, the output could look like markup
+                sys.stderr.write(f"--- {label}\n{script['stdout']}{script['error'] or ''}\n")
+        if expected["error"] is not None:
+            print(f"[yellow]FAIL[/yellow] {filename}: {expected['error']}", file=sys.stderr)
+    print(f"{len(files)} tests, {differences} differences between the configurations")
+    return differences == 0
+
+
+def repl(options):
     # Initializes the REPL history
     if not os.path.exists(histfile):
         with open(histfile, "w") as _:
@@ -33,18 +224,17 @@ def repl():
     readline.read_history_file(histfile)
     readline.set_history_length(histfile_size)
 
-    interpreter = Interpreter()
+    # Types proven for a line could be broken by the next ones
+    interpreter = make_interpreter(options, infer=False, output=RichOutput())
     while True:
         try:
             code = input("hul> ")
             if code == "print_scope()":
-                print(interpreter.env.values)
+                print({name: interpreter.globals.values[slot] for name, slot in interpreter.resolver.globals.items()})
                 continue
             if not code:
                 continue
-            lexer = Lexer(code)
-            parser = Parser(lexer)
-            result = interpreter.interpret(parser)
+            result = interpreter.run(parse(code, options))
             print(result)
 
             readline.write_history_file(histfile)
@@ -62,12 +252,88 @@ def repl():
 
 
 if __name__ == "__main__":
-    if len(sys.argv) == 1:
-        repl()
+    arg_parser = argparse.ArgumentParser(description="Huil interpreter, starts a REPL when no file is given.")
+    arg_parser.add_argument(
+        "-f", dest="files", nargs="+", help="file to interpret, or files and directories to run as a batch"
+    )
+    arg_parser.add_argument(
+        "-t",
+        dest="tests",
+        action="store_true",
+        help="run examples/tests on every engine, with and without -O, --lazy and budgets, and compare what they print",
+    )
+    arg_parser.add_argument(
+        "--engine", choices=ENGINES, default="tree", help="tree walking interpreter (default) or bytecode VM"
+    )
+    arg_parser.add_argument("-O", dest="optimize", action="store_true", help="fold constants and remove dead code")
+    arg_parser.add_argument(
+        "--node-counts", action="store_true", help="with -O, print the number of nodes before and after optimizing"
+    )
+    arg_parser.add_argument(
+        "--memo-size",
+        type=int,
+        default=1024,
+        help="results remembered for each pure function (default 1024), 0 disables memoization",
+    )
+    arg_parser.add_argument(
+        "--lazy", action="store_true", help="only parse the body of a function when it is first called"
+    )
+    arg_parser.add_argument("--memo-stats", action="store_true", help="print the memoization counters at exit")
+    arg_parser.add_argument(
+        "--no-cache", action="store_true", help="parse the file even if it didn't change since the last run"
+    )
+    arg_parser.add_argument(
+        "--output-buffer",
+        type=int,
+        default=BUFFER_SIZE,
+        help=f"characters printed by the program kept before writing them (default {BUFFER_SIZE}), 0 writes each line",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="time the functions and lines of the program (on the tree walking interpreter) and report them",
+    )
+    arg_parser.add_argument(
+        "--profile-stacks", metavar="FILE", help="with --profile, write the collapsed stacks for flame graph tools"
+    )
+    arg_parser.add_argument("--max-steps", type=int, help="stop the program after this many loop iterations and calls")
+    arg_parser.add_argument("--timeout", type=float, help="stop the program after this many seconds")
+    arg_parser.add_argument("--max-depth", type=int, help="stop the program when calls are nested deeper than this")
+    arg_parser.add_argument(
+        "--max-memory", type=float, help="stop the program when it made the process use this many more MB (roughly)"
+    )
+    arg_parser.add_argument(
+        "--jobs", type=int, help="run the files in a batch on this many processes (default: one per CPU)"
+    )
+    arg_parser.add_argument("--summary", metavar="FILE", help="write the JSON summary of a batch to FILE, not stdout")
+    arg_parser.add_argument(
+        "--bench", action="store_true", help="run the benchmark suite (benchmarks/programs) on every engine"
+    )
+    arg_parser.add_argument("--bench-repeat", type=int, default=5, help="with --bench, runs of each program")
+    arg_parser.add_argument("--bench-output", metavar="FILE", help="with --bench, store the results as JSON")
+    arg_parser.add_argument(
+        "--bench-compare", metavar="FILE", help="with --bench, compare with results stored by --bench-output"
+    )
+    args = arg_parser.parse_args()
+    if args.profile and args.engine != "tree":
+        arg_parser.error("--profile only runs on the tree walking interpreter")
+
+    if args.bench:
+        # Only imported here, the suite isn't needed to run a file and would add to the startup of every run
+        from benchmarks.suite import bench
+
+        bench(tuple(ENGINES), args.bench_repeat, None, args.bench_output, args.bench_compare)
+
+    elif args.tests:
+        if not run_tests(args):
+            sys.exit(1)
+
+    elif args.files and (len(args.files) > 1 or os.path.isdir(args.files[0]) or args.jobs):
+        if not run_batch(args.files, args):
+            sys.exit(1)
 
-    elif sys.argv[1] == "-t":
-        print("Running tests...")
-        print("...jk")
+    elif args.files:
+        test_file(args.files[0], args)
 
-    elif sys.argv[1] == "-f" and len(sys.argv) == 3:
-        test_file(sys.argv[2])
+    else:
+        repl(args)
@@ -0,0 +1,252 @@
+import gc
+import marshal
+from array import array
+from dataclasses import fields
+
+import src.ast
+from src.ast import ASTNode
+from src.token import Token
+
+
+# Node fields are stored as ints in Arena.data, the 2 low bits tell what the rest is
+NODE = 0  # index of the node
+CONSTANT = 1  # index in Arena.constants
+LIST = 2  # position in Arena.data of the length of the list, followed by its items
+NONE = 3
+
+# In Arena.token_types, for nodes without token (statement lists, `let a` values)
+NO_TOKEN = 0xFFFF
+
+
+class Arena:
+    """Struct of arrays layout of a tree, for huge programs.
+
+    Instead of an object per node and per token, nodes are numbers: their class, their token and where their
+    fields start are stored in typed arrays at that index. Fields are stored in one more array, values which
+    aren't nodes (names, literals) are kept once in `constants`.
+
+    Nodes are added children first, so the root is the last one. The arena is meant for trees straight out of
+    the Parser, the fields filled later (bytecode, memoization) aren't kept.
+    """
+
+    def __init__(self):
+        # Node classes and token types, by name, the arrays hold indexes in them
+        self.classes = []
+        self.types = []
+        self.kinds = array("H")
+        self.token_types = array("H")
+        self.token_values = array("q")
+        self.lines = array("i")
+        self.columns = array("i")
+        self.offsets = array("q")
+        self.data = array("q")
+        self.constants = []
+        self.root = None
+        # Where each class, type and constant already is in its list
+        self._class_indexes = {}
+        self._type_indexes = {}
+        self._constant_indexes = {}
+        self._fields = {}
+
+    @classmethod
+    def from_tree(cls, tree):
+        arena = cls()
+        arena.root = arena.add(tree)
+        return arena
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @staticmethod
+    def intern(names, indexes, name):
+        if name not in indexes:
+            indexes[name] = len(names)
+            names.append(name)
+        return indexes[name]
+
+    def constant(self, value):
+        if value is None:
+            return NONE
+        try:
+            # 1 and True are equal, they still are different constants
+            key = (type(value), value)
+            index = self._constant_indexes.get(key)
+        except TypeError:
+            key, index = None, None
+        if index is None:
+            index = len(self.constants)
+            self.constants.append(value)
+            if key is not None:
+                self._constant_indexes[key] = index
+        return index << 2 | CONSTANT
+
+    def encode(self, value):
+        if isinstance(value, ASTNode):
+            return self.add(value) << 2 | NODE
+        if isinstance(value, list):
+            items = [self.encode(item) for item in value]
+            position = len(self.data)
+            self.data.append(len(items))
+            self.data.extend(items)
+            return position << 2 | LIST
+        return self.constant(value)
+
+    def node_fields(self, cls):
+        # The fields left out (compare=False) are the last ones, the others can be given by position
+        if cls not in self._fields:
+            self._fields[cls] = [field.name for field in fields(cls) if field.compare and field.name != "token"]
+        return self._fields[cls]
+
+    def add(self, node):
+        """Store `node` and its children, return its index."""
+        cls = type(node)
+        # Children are stored first, the fields of this node are then contiguous
+        values = [self.encode(getattr(node, name)) for name in self.node_fields(cls)]
+        self.offsets.append(len(self.data))
+        self.data.extend(values)
+
+        self.kinds.append(self.intern(self.classes, self._class_indexes, cls.__name__))
+        token = node.token
+        if token is None:
+            self.token_types.append(NO_TOKEN)
+            self.token_values.append(NONE)
+            self.lines.append(0)
+            self.columns.append(0)
+        else:
+            self.token_types.append(self.intern(self.types, self._type_indexes, token.type))
+            self.token_values.append(self.constant(token.value))
+            self.lines.append(token.line)
+            self.columns.append(token.column)
+        return len(self.kinds) - 1
+
+    def decode(self, value):
+        tag, payload = value & 3, value >> 2
+        if tag == NODE:
+            return self.node(payload)
+        if tag == CONSTANT:
+            return self.constants[payload]
+        if tag == LIST:
+            length = self.data[payload]
+            return [self.decode(item) for item in self.data[payload + 1 : payload + 1 + length]]
+        return None
+
+    def token(self, index):
+        if self.token_types[index] == NO_TOKEN:
+            return None
+        return Token(
+            self.types[self.token_types[index]],
+            self.decode(self.token_values[index]),
+            self.lines[index],
+            self.columns[index],
+        )
+
+    def node(self, index):
+        """Rebuild the node at `index` and its children as regular objects."""
+        cls = getattr(src.ast, self.classes[self.kinds[index]])
+        names = self.node_fields(cls)
+        offset = self.offsets[index]
+        values = {name: self.decode(self.data[offset + i]) for i, name in enumerate(names)}
+        return cls(token=self.token(index), **values)
+
+    def tree(self):
+        """Rebuild the whole tree, in one pass over the nodes since children come before their parent.
+
+        Same result as `node(root)`, a lot faster: it's how cached programs are loaded.
+        """
+        # Nothing built here can be garbage yet, collecting while creating that many objects only slows down
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return self.build()
+        finally:
+            if collecting:
+                gc.enable()
+
+    def build(self):
+        classes = [getattr(src.ast, name) for name in self.classes]
+        counts = [len(self.node_fields(cls)) for cls in classes]
+        types = self.types
+        data = self.data
+        constants = self.constants
+        nodes = []
+
+        def decode_list(position):
+            items = []
+            for item in data[position + 1 : position + 1 + data[position]]:
+                tag = item & 3
+                if tag == NODE:
+                    items.append(nodes[item >> 2])
+                elif tag == CONSTANT:
+                    items.append(constants[item >> 2])
+                elif tag == LIST:
+                    items.append(decode_list(item >> 2))
+                else:
+                    items.append(None)
+            return items
+
+        for kind, offset, token_type, token_value, line, column in zip(
+            self.kinds, self.offsets, self.token_types, self.token_values, self.lines, self.columns
+        ):
+            if token_type == NO_TOKEN:
+                arguments = [None]
+            else:
+                value = constants[token_value >> 2] if token_value & 3 == CONSTANT else None
+                arguments = [Token(types[token_type], value, line, column)]
+            for item in data[offset : offset + counts[kind]]:
+                tag = item & 3
+                if tag == NODE:
+                    arguments.append(nodes[item >> 2])
+                elif tag == CONSTANT:
+                    arguments.append(constants[item >> 2])
+                elif tag == LIST:
+                    arguments.append(decode_list(item >> 2))
+                else:
+                    arguments.append(None)
+            nodes.append(classes[kind](*arguments))
+        return nodes[self.root]
+
+    def dumps(self):
+        """Binary form of the arena, every value in `constants` must be supported by marshal."""
+        return marshal.dumps(
+            (
+                self.classes,
+                self.types,
+                self.kinds.tobytes(),
+                self.token_types.tobytes(),
+                self.token_values.tobytes(),
+                self.lines.tobytes(),
+                self.columns.tobytes(),
+                self.offsets.tobytes(),
+                self.data.tobytes(),
+                self.constants,
+                self.root,
+            )
+        )
+
+    @classmethod
+    def loads(cls, data):
+        arena = cls()
+        (
+            arena.classes,
+            arena.types,
+            kinds,
+            token_types,
+            token_values,
+            lines,
+            columns,
+            offsets,
+            data,
+            arena.constants,
+            arena.root,
+        ) = marshal.loads(data)
+        for array_, raw in (
+            (arena.kinds, kinds),
+            (arena.token_types, token_types),
+            (arena.token_values, token_values),
+            (arena.lines, lines),
+            (arena.columns, columns),
+            (arena.offsets, offsets),
+            (arena.data, data),
+        ):
+            array_.frombytes(raw)
+        return arena
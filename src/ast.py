@@ -1,63 +1,149 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from tokenize import Token
 from typing import Any, List
 
 
+def slotted(cls):
+    """Rebuild a dataclass with `__slots__` for its fields, which saves the `__dict__` of every node.
+
+    Same thing as `@dataclass(slots=True)`, which needs Python 3.10.
+    """
+    own_fields = tuple(name for name in cls.__annotations__ if name in cls.__dataclass_fields__)
+    namespace = dict(cls.__dict__)
+    for name in own_fields:
+        # Defaults are kept by __init__, they would conflict with the slots
+        namespace.pop(name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    namespace["__slots__"] = own_fields
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+@slotted
 @dataclass
 class ASTNode:
     token: Token
 
 
+@slotted
 @dataclass
 class BinaryOpNode(ASTNode):
     left: ASTNode
     right: ASTNode
+    # Set to False when the TypeInference proved the operands have the right types
+    checked: bool = field(default=True, repr=False, compare=False)
+    # (left type, right type, operator function) specialized for the last operands, see Interpreter
+    quick: Any = field(default=None, repr=False, compare=False)
+
+
+@slotted
+@dataclass
+class ArrayNode(ASTNode):
+    # `[1, 2, 3]`, makes a NumArray
+    elements: List[ASTNode]
+
+
+@slotted
+@dataclass
+class IndexNode(ASTNode):
+    # `value[index]`
+    value: ASTNode
+    index: ASTNode
+
+
+@slotted
+@dataclass
+class ComparisonNode(ASTNode):
+    # Chained comparison: `operands[i] operators[i] operands[i + 1]` for each operator (a token type)
+    operands: List[ASTNode]
+    operators: List[str]
 
 
+@slotted
 @dataclass
 class BooleanNode(ASTNode):
     value: bool
 
 
+@slotted
 @dataclass
 class UnaryOpNode(ASTNode):
     value: ASTNode
+    # (value type, operator function) specialized for the last value
+    quick: Any = field(default=None, repr=False, compare=False)
 
 
+@slotted
 @dataclass
 class NumNode(ASTNode):
     value: int or float
     ...
 
 
+@slotted
 @dataclass
 class StringNode(ASTNode):
     value: str
 
 
+@slotted
 @dataclass
 class NilNode(ASTNode):
     ...
 
 
+@slotted
 @dataclass
 class VariableNode(ASTNode):
     id: str
+    # Lexical address, filled in by the Resolver: how many scopes up, and where in that scope
+    depth: int = None
+    slot: int = None
+    # Set by the Resolver on a global read by the program itself after the `let` of the same program declaring
+    # it unconditionally: it can't be unset
+    bound: bool = False
 
 
+@slotted
+@dataclass
+class WildcardNode(ASTNode):
+    # `*` pattern of a match, matches anything
+    ...
+
+
+@slotted
 @dataclass
 class MatchNode(ASTNode):
     factor: ASTNode
+    # [pattern, expression] arms
     matches: List[List[ASTNode]]
+    # Set on the first run when every pattern is a literal, see match_table
+    table: Any = field(default=None, repr=False, compare=False)
 
 
+@slotted
 @dataclass
 class FunctionNode(ASTNode):
     id: str
     arguments: List[str]
     statements: "StatementListNode"
-
-
+    slot: int = None
+    # Number of slots (arguments first, then local variables) of the scope created by a call
+    scope_size: int = None
+    # Skimmed by a lazy Parser: `statements` is None until the first call, `source` is the body and `line`
+    # where it starts in the file
+    source: str = None
+    line: int = None
+    # Resolver scopes the function is declared in, to resolve the body once it is parsed
+    scopes: Any = field(default=None, repr=False, compare=False)
+    # Bytecode of the body, filled in by the compiler when running on the VM
+    code: Any = field(default=None, repr=False, compare=False)
+    # Set by the PurityAnalyzer, pure functions get a MemoCache when memoization is enabled
+    pure: bool = field(default=False, repr=False, compare=False)
+    memo: Any = field(default=None, repr=False, compare=False)
+
+
+@slotted
 @dataclass
 class IfThenElseNode(ASTNode):
     conditions: List[ASTNode]
@@ -65,35 +151,109 @@ class IfThenElseNode(ASTNode):
     else_statements: "StatementListNode"
 
 
+@slotted
 @dataclass
 class WhileNode(ASTNode):
     condition: ASTNode
     statements: "StatementListNode"
 
 
+@slotted
+@dataclass
+class ForNode(ASTNode):
+    # `for id in start..end:`, over the ints from start to end (excluded)
+    id: str
+    start: ASTNode
+    end: ASTNode
+    statements: "StatementListNode"
+    # Always in the current scope, declared by the loop unless it already is
+    slot: int = None
+
+
+@slotted
 @dataclass
 class FunctionCallNode(ASTNode):
     id: str
     arguments: List[Any]
+    depth: int = None
+    slot: int = None
+    # Set by the Resolver when calling a builtin, so it can be called without looking it up
+    native: Any = None
 
 
+@slotted
 @dataclass
 class ReturnNode(ASTNode):
     value: Any
+    # Set by the Resolver when returning the result of a call, which can then reuse the caller's frame
+    tail: bool = False
 
 
+@slotted
 @dataclass
 class AssignmentNode(ASTNode):
     id: str
     value: Any
+    depth: int = None
+    slot: int = None
 
 
+@slotted
 @dataclass
 class DeclarationNode(ASTNode):
     id: str
     value: Any
+    # Always declared in the current scope
+    slot: int = None
 
 
+@slotted
 @dataclass
 class StatementListNode(ASTNode):
     statements: List[ASTNode]
+
+
+# Field names of each node class, fields() is slow enough to show up when walking large trees
+_field_names = {}
+
+
+def iter_child_nodes(node):
+    """List the direct children of a node, whatever field (or list of lists) they are stored in."""
+    cls = type(node)
+    names = _field_names.get(cls)
+    if names is None:
+        # The token isn't a node
+        names = _field_names[cls] = [node_field.name for node_field in fields(cls) if node_field.name != "token"]
+    children = []
+    for name in names:
+        value = getattr(node, name)
+        if isinstance(value, ASTNode):
+            children.append(value)
+        elif isinstance(value, list):
+            _nodes_in(value, children)
+    return children
+
+
+def _nodes_in(values, children):
+    for value in values:
+        if isinstance(value, ASTNode):
+            children.append(value)
+        elif isinstance(value, list):
+            _nodes_in(value, children)
+
+
+def match_table(node):
+    """For a match whose patterns are all literals, and maybe a `*`: the expression of each value (the first
+    arm wins) and the expression of `*` (None without one). None when some pattern has to be computed."""
+    table = {}
+    for pattern, expression in node.matches:
+        if type(pattern) is WildcardNode:
+            return table, expression
+        if type(pattern) not in (NumNode, StringNode, BooleanNode):
+            return None
+        table.setdefault(pattern.value, expression)
+    return table, None
+
+
+def count_nodes(node):
+    return 1 + sum(count_nodes(child) for child in iter_child_nodes(node))
@@ -0,0 +1,161 @@
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows, memory budgets aren't available there
+    resource = None
+
+from src.exceptions import BudgetExceeded
+
+
+STATM = "/proc/self/statm"
+
+
+def peak_memory():
+    """Most memory the process ever used, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_memory():
+    """Memory the process uses now (its resident set), in bytes. Without /proc (macOS), the most it ever used."""
+    if not os.path.exists(STATM):
+        return peak_memory()
+    with open(STATM) as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+class Budget:
+    """Limits of a run, for programs which can't be trusted to end. None means no limit.
+
+    `steps` counts loop iterations and function calls: a program without them runs each node at most once, so
+    they are the only places where it can run away, and checking there keeps the cost off every other node.
+    `depth` is how many calls can be nested (tail calls don't nest).
+
+    A single step can take long (an operator on a large array, a builtin), so the deadline isn't left to the
+    step count: a timer marks the budget as expired and the next step stops the run. `memory` is approximate:
+    how much the resident memory of the process grew since the start of the run, in bytes, read every
+    `check_every` steps. What builtins and operators on arrays and strings allocate at once is checked before
+    they allocate it (see `allocate`). Without /proc (macOS), the growth of the peak memory of the process is
+    used instead, so in a batch (see main.py --jobs) a file isn't charged until it goes past the peak of the
+    files run before it in the same process. Processes running calls for a budgeted program (pmap, preduce) each
+    get a share of what is left (see `split`), and the steps they take are added back.
+
+    An interpreter given a Budget raises BudgetExceeded as soon as a limit is crossed.
+    """
+
+    def __init__(self, steps=None, seconds=None, depth=None, memory=None, check_every=1000):
+        if memory is not None and resource is None:
+            raise ValueError("Memory budgets need the resource module, which isn't available on this platform")
+        self.max_steps = steps
+        self.max_seconds = seconds
+        self.max_depth = depth
+        self.max_memory = memory
+        self.check_every = check_every
+        self.timer = None
+        self.start()
+
+    def start(self):
+        """Reset the usage, for a new run."""
+        self.steps = 0
+        self.depth = 0
+        self.started = time.perf_counter()
+        self.deadline = None if self.max_seconds is None else self.started + self.max_seconds
+        self.memory_base = current_memory() if self.max_memory is not None else 0
+        self.next_check = 0
+        self.expired = False
+        self.stop()
+        if self.max_seconds is not None:
+            self.timer = threading.Timer(self.max_seconds, self.expire)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def stop(self):
+        """End of the run."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def expire(self):
+        # From the timer's thread, the run sees it at its next step
+        self.expired = True
+
+    def step(self):
+        self.steps += 1
+        if self.steps >= self.next_check or self.expired:
+            self.check()
+
+    def enter(self, depth):
+        """A function call, `depth` calls deep."""
+        self.depth = depth
+        if self.max_depth is not None and depth > self.max_depth:
+            self.exceeded("Call depth")
+
+    def check(self):
+        if self.max_steps is not None and self.steps > self.max_steps:
+            self.exceeded("Step")
+        if self.expired or (self.deadline is not None and time.perf_counter() > self.deadline):
+            self.exceeded("Time")
+        if self.max_memory is not None and self.memory() > self.max_memory:
+            self.exceeded("Memory")
+        self.next_check = self.steps + self.check_every
+        if self.max_steps is not None:
+            self.next_check = min(self.next_check, self.max_steps + 1)
+
+    def remaining(self):
+        """Seconds left before the deadline, None without one."""
+        return None if self.deadline is None else max(self.deadline - time.perf_counter(), 0)
+
+    def split(self, parts):
+        """What is left of the steps and the memory, shared between `parts` processes: the (steps, bytes) each one
+        gets, None without a limit. See `take`."""
+        steps = None if self.max_steps is None else max(self.max_steps - self.steps, 0) // parts
+        memory = None if self.max_memory is None else max(self.max_memory - self.memory(), 0) // parts
+        return steps, memory
+
+    def take(self, steps, memory):
+        """In a process forked with a copy of this budget (a worker of pmap): limit it to its share (see `split`)
+        and what is left until the deadline, counting from 0 in this process."""
+        self.max_steps = steps
+        self.max_memory = memory
+        self.max_seconds = self.remaining()
+        self.start()
+
+    def allocate(self, size):
+        """Check that `size` more bytes fit in the memory budget, before allocating them."""
+        if self.max_memory is not None and size and self.memory() + size > self.max_memory:
+            self.exceeded("Memory")
+
+    def guard(self, operations, sizes):
+        """Operator functions like `operations` (by token type), each one first checking that what it allocates
+        fits in the memory budget. `sizes` gives, by token type, a function of the operands returning how many
+        bytes the operation allocates."""
+        return {
+            operator_type: self.guarded(function, sizes[operator_type]) for operator_type, function in operations.items()
+        }
+
+    def guarded(self, function, size):
+        def operation(*operands):
+            self.allocate(size(*operands))
+            return function(*operands)
+
+        return operation
+
+    def memory(self):
+        return max(current_memory() - self.memory_base, 0) if resource is not None else None
+
+    def usage(self):
+        return {
+            "steps": self.steps,
+            "seconds": time.perf_counter() - self.started,
+            "depth": self.depth,
+            "memory": self.memory() if self.max_memory is not None else None,
+        }
+
+    def exceeded(self, limit):
+        raise BudgetExceeded(f"{limit} budget exceeded", self.usage())
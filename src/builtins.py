@@ -0,0 +1,226 @@
+import inspect
+from types import MappingProxyType
+
+import readline  # Necessary to have a nice python input()
+
+from src.environment import Closure
+from src.exceptions import RuntimeException, TypeError
+from src.numarray import FLOATS, INTS, ITEM_SIZE, NumArray
+from src.parallel import run_parallel
+from src.rope import Rope, pending
+
+
+class NativeFunction:
+    """A function implemented in Python.
+
+    It is called with the interpreter running it, followed by the (already evaluated) Huil arguments. Strings
+    built by concatenation are flattened to a `str` before the call. Builtins allocating a lot at once check it
+    against the memory budget of the interpreter first, if it has one.
+    """
+
+    def __init__(self, name, function, pure=False):
+        self.name = name
+        self.function = function
+        # Only depends on its arguments and has no side effect (see src/purity.py)
+        self.pure = pure
+        parameters = list(inspect.signature(function).parameters.values())[1:]
+        self.min_args = sum(1 for p in parameters if p.default is p.empty and p.kind != p.VAR_POSITIONAL)
+        if any(p.kind == p.VAR_POSITIONAL for p in parameters):
+            self.max_args = None
+        else:
+            self.max_args = len(parameters)
+
+    def call(self, interpreter, args):
+        if len(args) < self.min_args:
+            raise TypeError(f"Missing arguments for {self.name}: expected {self.min_args}, got {len(args)}")
+        if self.max_args is not None and len(args) > self.max_args:
+            raise TypeError(f"Too many arguments for {self.name}: expected {self.max_args}, got {len(args)}")
+        if interpreter.budget is not None:
+            interpreter.budget.allocate(sum(pending(arg) for arg in args))
+        return self.function(interpreter, *[arg.flatten() if type(arg) is Rope else arg for arg in args])
+
+    def __repr__(self):
+        return f"<native fn {self.name}>"
+
+
+_builtins = {}
+# Shared by every interpreter, and read only: use `register` to add a function
+BUILTINS = MappingProxyType(_builtins)
+
+
+def register(name, pure=False):
+    """Decorator adding a Python function to the builtins, under the given Huil name:
+
+    @register("double", pure=True)
+    def double(interpreter, value):
+        return value * 2
+    """
+
+    def decorator(function):
+        if name in _builtins:
+            raise ValueError(f"Builtin already registered: {name}")
+        _builtins[name] = NativeFunction(name, function, pure)
+        return function
+
+    return decorator
+
+
+@register("print")
+def print_(interpreter, text):
+    interpreter.output.write(text)
+
+
+@register("input")
+def read_input(interpreter, prompt=""):
+    # TODO It's probably the users responsability to transform it to int ou float
+    # What was printed so far comes before the prompt
+    interpreter.output.flush()
+    text = input(prompt)
+    # https://nbviewer.org/github/rasbt/One-Python-benchmark-per-day/blob/master/ipython_nbs/day6_string_is_number.ipynb?create=1
+    if text.isdigit():
+        return int(text)
+    if text.replace(".", "", 1).isdigit():
+        return float(text)
+    return text
+
+
+CONVERTIBLE = (int, float, bool, str)
+
+
+@register("to_int", pure=True)
+def to_int(interpreter, value):
+    if type(value) not in CONVERTIBLE:
+        raise TypeError(f"Can't convert {value!r} to int")
+    try:
+        return int(value)
+    except (ValueError, OverflowError):
+        raise TypeError(f"Can't convert {value!r} to int")
+
+
+@register("to_float", pure=True)
+def to_float(interpreter, value):
+    if type(value) not in CONVERTIBLE:
+        raise TypeError(f"Can't convert {value!r} to float")
+    try:
+        return float(value)
+    except ValueError:
+        raise TypeError(f"Can't convert {value!r} to float")
+
+
+@register("to_string", pure=True)
+def to_string(interpreter, value):
+    return str(value)
+
+
+@register("len", pure=True)
+def length(interpreter, value):
+    if type(value) is not str and type(value) is not NumArray:
+        raise TypeError(f"Can't take the length of {value!r}")
+    return len(value)
+
+
+def elements(name, value):
+    """Data of an array given to a reduction."""
+    if type(value) is not NumArray:
+        raise TypeError(f"Can't take the {name} of {value!r}, it isn't an array")
+    return value.data
+
+
+# Reductions run over the whole buffer in a single Python call
+@register("sum", pure=True)
+def sum_(interpreter, values):
+    return sum(elements("sum", values))
+
+
+@register("min", pure=True)
+def min_(interpreter, values):
+    data = elements("min", values)
+    if not data:
+        raise RuntimeException("Can't take the min of an empty array")
+    return min(data)
+
+
+@register("max", pure=True)
+def max_(interpreter, values):
+    data = elements("max", values)
+    if not data:
+        raise RuntimeException("Can't take the max of an empty array")
+    return max(data)
+
+
+@register("range", pure=True)
+def range_(interpreter, start, end):
+    if type(start) is not int or type(end) is not int:
+        raise TypeError(f"Can't make a range from {start!r} to {end!r}")
+    if interpreter.budget is not None:
+        interpreter.budget.allocate(ITEM_SIZE * max(end - start, 0))
+    return NumArray.build(INTS, range(start, end))
+
+
+@register("fill", pure=True)
+def fill(interpreter, count, value):
+    if type(count) is not int or (type(value) is not int and type(value) is not float):
+        raise TypeError(f"Can't fill an array of {count!r} with {value!r}")
+    if interpreter.budget is not None:
+        interpreter.budget.allocate(ITEM_SIZE * max(count, 0))
+    filled = NumArray.build(FLOATS if type(value) is float else INTS, [value])
+    filled.data *= max(count, 0)
+    return filled
+
+
+# Strings and numbers (elements of arrays included) joined in a single step
+@register("join", pure=True)
+def join(interpreter, separator, *values):
+    if type(separator) is not str:
+        raise TypeError(f"Can't join with {separator!r}")
+    texts = []
+    for value in values:
+        if type(value) is str:
+            texts.append(value)
+        elif type(value) is NumArray:
+            texts.extend(map(str, value.data))
+        elif type(value) is int or type(value) is float:
+            texts.append(str(value))
+        else:
+            raise TypeError(f"Can't join {value!r}")
+    return separator.join(texts)
+
+
+def call(interpreter, function, args, name):
+    """Call a Huil function (or a builtin) given to the builtin `name`."""
+    if type(function) is NativeFunction:
+        return function.call(interpreter, args)
+    if type(function) is not Closure:
+        raise TypeError(f"Can't call {function!r} in {name}")
+    if len(function.function.arguments) != len(args):
+        raise TypeError(f"{name} needs a function of {len(args)} argument{'s' if len(args) > 1 else ''}")
+    return interpreter.call(function, args)
+
+
+# Pure functions are called in worker processes (see src/parallel.py), other ones one after the other
+@register("pmap")
+def pmap(interpreter, function, values):
+    values = elements("pmap", values)
+    results = None
+    if type(function) is Closure and function.function.pure and len(function.function.arguments) == 1:
+        results = run_parallel(interpreter, function, values)
+    if results is None:
+        results = [call(interpreter, function, [value], "pmap") for value in values]
+    return NumArray.of(results)
+
+
+# The function has to be associative: chunks are reduced on their own, then their results
+@register("preduce")
+def preduce(interpreter, function, values):
+    values = elements("preduce", values)
+    if not values:
+        raise RuntimeException("Can't reduce an empty array")
+    partials = None
+    if type(function) is Closure and function.function.pure and len(function.function.arguments) == 2:
+        partials = run_parallel(interpreter, function, values, reducing=True)
+    if partials is None:
+        partials = values
+    result = partials[0]
+    for value in partials[1:]:
+        result = call(interpreter, function, [result, value], "preduce")
+    return result
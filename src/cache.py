@@ -0,0 +1,109 @@
+import hashlib
+import os
+import sys
+import tempfile
+
+from src.arena import Arena
+
+
+# Bumped when the way programs are stored changes
+FORMAT = 1
+DIRECTORY = ".huil_cache"
+
+
+# Modules deciding what the tree of a program is: tokens, parsing, the nodes and how they are stored, and -O
+# (which folds operations with the Interpreter's own operators)
+SOURCES = (
+    "lexer.py",
+    "scanner.py",
+    "reserved_keywords.py",
+    "token.py",
+    "tokens.py",
+    "parser.py",
+    "ast.py",
+    "arena.py",
+    "optimizer.py",
+    "interpreter.py",
+    "inference.py",
+    "numarray.py",
+    "rope.py",
+)
+
+
+def sources_digest():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Anything which changes how a program is parsed, stored or read back invalidates the whole cache: editing one
+# of the SOURCES, or running another Python (marshal's format depends on it)
+VERSION = ";".join([str(FORMAT), sys.version.split()[0], sources_digest()]).encode()
+
+
+class Cache:
+    """Trees of the programs already parsed, stored in `directory` like `.pyc` files.
+
+    An entry is found by the hash of the source, the interpreter version and the options the tree depends on
+    (`-O`). Entries are never updated, a changed program gets a new one, so reading a file being written
+    by another run is the only risk: files are written under a temporary name and renamed once complete.
+    Entries which can't be read are ignored.
+    """
+
+    def __init__(self, directory=DIRECTORY):
+        self.directory = directory
+
+    def key(self, path, flags=()):
+        digest = hashlib.sha256(VERSION)
+        for flag in flags:
+            digest.update(b"\0" + flag.encode())
+        digest.update(b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def get(self, key):
+        """The tree stored for `key`, None when there's none (or it is corrupted)."""
+        try:
+            with open(self.path(key), "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+
+        checksum, data = content[:32], content[32:]
+        if hashlib.sha256(data).digest() != checksum:
+            return None
+        try:
+            return Arena.loads(data).tree()
+        except Exception:
+            # Valid checksum but unreadable, written by a version of the interpreter with a bug
+            return None
+
+    def put(self, key, tree):
+        try:
+            data = Arena.from_tree(tree).dumps()
+        except ValueError:
+            # A value marshal can't store
+            return
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(descriptor, "wb") as f:
+                    f.write(hashlib.sha256(data).digest())
+                    f.write(data)
+                os.replace(temporary, self.path(key))
+            except BaseException:
+                os.unlink(temporary)
+                raise
+        except OSError:
+            # The cache is only there to go faster, running from a read-only directory is fine
+            pass
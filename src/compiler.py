@@ -0,0 +1,346 @@
+from src.ast import BinaryOpNode, WildcardNode, match_table
+from src.inference import OPERATIONS
+from src.opcodes import *
+from src.token import *
+from src.visitor import NodeVisitor
+
+
+BINARY_OPCODES = {
+    PLUS: BINARY_ADD,
+    MINUS: BINARY_SUBTRACT,
+    MUL: BINARY_MULTIPLY,
+    DIV: BINARY_DIVIDE,
+    MOD: BINARY_MODULO,
+    SUPEQUAL: COMPARE_SUPEQUAL,
+    INF: COMPARE_INF,
+    SUP: COMPARE_SUP,
+    EQUAL: COMPARE_EQUAL,
+    NOTEQUAL: COMPARE_NOTEQUAL,
+    INFEQUAL: COMPARE_INFEQUAL,
+}
+
+UNARY_OPCODES = {
+    NOT: UNARY_NOT,
+    PLUS: UNARY_POSITIVE,
+    MINUS: UNARY_NEGATIVE,
+}
+
+
+class Code:
+    """A compiled program or function body."""
+
+    def __init__(self, name):
+        self.name = name
+        self.instructions = []
+        self.constants = []
+
+    def emit(self, opcode, argument=0):
+        """Append an instruction and return its position, so jumps can be patched later."""
+        self.instructions.append(opcode)
+        self.instructions.append(argument)
+        return len(self.instructions) - 2
+
+    def patch(self, position, target=None):
+        """Point the jump at `position` to `target` (by default, the next emitted instruction)."""
+        self.instructions[position + 1] = len(self.instructions) if target is None else target
+
+    def add_constant(self, value):
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def disassemble(self):
+        lines = [f"Code {self.name}:"]
+        for position in range(0, len(self.instructions), 2):
+            opcode, argument = self.instructions[position], self.instructions[position + 1]
+            if opcode in (LOAD_CONST, LOAD_DEREF, STORE_DEREF):
+                detail = f"({self.constants[argument]!r})"
+            else:
+                detail = ""
+            lines.append(f"{position:>6} {OPNAMES[opcode]:<20} {argument} {detail}")
+        return "\n".join(lines)
+
+
+class Compiler(NodeVisitor):
+    """Translates the AST into bytecode for the VM.
+
+    The generated code follows the tree walking Interpreter step by step, including which arguments are
+    evaluated and in which order, so both engines print the same things. Variables are accessed through the
+    addresses computed by the Resolver.
+    """
+
+    def __init__(self):
+        self.code = None
+        # How many function bodies deep we are, variables this many scopes up are globals
+        self.depth = 0
+        # Jumps to the end of the program, for `return` outside of functions
+        self.program_exits = []
+
+    def compile(self, tree, name="<main>"):
+        self.code = Code(name)
+        self.program_exits = []
+        self.block(tree)
+        for position in self.program_exits:
+            self.code.patch(position)
+        self.code.emit(HALT)
+        return self.code
+
+    def block(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+            if statement.token.type != RETURN:
+                self.code.emit(POP_TOP)
+
+    def visit_StatementListNode(self, node):
+        # Nested statement lists only show up as blocks, which are compiled through `block`
+        self.block(node)
+        self.code.emit(LOAD_CONST, self.code.add_constant(None))
+
+    def visit_BinaryOpNode(self, node):
+        if node.token.type in (AND, OR):
+            self.logical(node)
+            return
+        self.visit(node.left)
+        self.visit(node.right)
+        if node.checked:
+            self.code.emit(BINARY_OPCODES[node.token.type], self.code.add_constant(node))
+        else:
+            self.code.emit(BINARY_UNCHECKED, self.code.add_constant(OPERATIONS[node.token.type]))
+
+    def logical(self, node):
+        # The left operand is the result when it decides it, the right operand is then skipped
+        error = self.code.add_constant(node)
+        self.visit(node.left)
+        if node.checked:
+            self.code.emit(CHECK_BOOL, error)
+        end = self.code.emit(JUMP_IF_FALSE_OR_POP if node.token.type == AND else JUMP_IF_TRUE_OR_POP)
+        self.visit(node.right)
+        if node.checked:
+            self.code.emit(CHECK_BOOL, error)
+        self.code.patch(end)
+
+    def visit_ComparisonNode(self, node):
+        # Each operand but the last stays under the result of its comparison, for the next one
+        self.visit(node.operands[0])
+        cleanups = []
+        for i, comparison in enumerate(node.operators):
+            self.visit(node.operands[i + 1])
+            # What the error message needs to know about this comparison
+            token = Token(comparison, COMPARISONS[comparison], node.token.line, node.token.column)
+            pair = BinaryOpNode(token, node.operands[i], node.operands[i + 1])
+            if i == len(node.operators) - 1:
+                self.code.emit(BINARY_OPCODES[comparison], self.code.add_constant(pair))
+            else:
+                self.code.emit(DUP_TOP)
+                self.code.emit(ROT_THREE)
+                self.code.emit(BINARY_OPCODES[comparison], self.code.add_constant(pair))
+                cleanups.append(self.code.emit(JUMP_IF_FALSE_OR_POP))
+
+        if cleanups:
+            end = self.code.emit(JUMP)
+            # A comparison was false: it is the result, the operand below it is dropped
+            for position in cleanups:
+                self.code.patch(position)
+            self.code.emit(ROT_TWO)
+            self.code.emit(POP_TOP)
+            self.code.patch(end)
+
+    def visit_UnaryOpNode(self, node):
+        self.visit(node.value)
+        self.code.emit(UNARY_OPCODES[node.token.type], self.code.add_constant(node))
+
+    def visit_ArrayNode(self, node):
+        for element in node.elements:
+            self.visit(element)
+        self.code.emit(BUILD_ARRAY, len(node.elements))
+
+    def visit_IndexNode(self, node):
+        self.visit(node.value)
+        self.visit(node.index)
+        self.code.emit(BINARY_SUBSCR, self.code.add_constant(node))
+
+    def visit_NilNode(self, node):
+        self.code.emit(LOAD_CONST, self.code.add_constant(None))
+
+    def visit_NumNode(self, node):
+        self.code.emit(LOAD_CONST, self.code.add_constant(node.value))
+
+    def visit_BooleanNode(self, node):
+        self.code.emit(LOAD_CONST, self.code.add_constant(node.value))
+
+    def visit_StringNode(self, node):
+        self.code.emit(LOAD_CONST, self.code.add_constant(node.value))
+
+    def variable(self, node, fast, global_, deref):
+        if node.depth == 0:
+            self.code.emit(fast, node.slot)
+        elif node.depth == self.depth:
+            self.code.emit(global_, node.slot)
+        else:
+            self.code.emit(deref, self.code.add_constant((node.depth, node.slot)))
+
+    def visit_VariableNode(self, node):
+        if node.depth == self.depth and not node.bound:
+            # A global can still be unset (see Resolver), LOAD_GLOBAL checks it, LOAD_FAST doesn't
+            self.code.emit(LOAD_GLOBAL, node.slot)
+        else:
+            self.variable(node, LOAD_FAST, LOAD_GLOBAL, LOAD_DEREF)
+
+    def visit_DeclarationNode(self, node):
+        self.visit(node.value)
+        self.code.emit(STORE_FAST, node.slot)
+        self.code.emit(LOAD_CONST, self.code.add_constant(None))
+
+    def visit_AssignmentNode(self, node):
+        self.visit(node.value)
+        self.variable(node, STORE_FAST, STORE_GLOBAL, STORE_DEREF)
+        self.code.emit(LOAD_CONST, self.code.add_constant(None))
+
+    def visit_MatchNode(self, node):
+        self.visit(node.factor)
+        table = match_table(node)
+        if table is not None:
+            self.match_table(*table)
+            return
+
+        ends = []
+        for pattern, expression in node.matches:
+            if type(pattern) is WildcardNode:
+                self.code.emit(POP_TOP)
+                self.visit(expression)
+                ends.append(self.code.emit(JUMP))
+                break
+            self.code.emit(DUP_TOP)
+            self.visit(pattern)
+            self.code.emit(MATCH_EQUAL)
+            next_pattern = self.code.emit(POP_JUMP_IF_FALSE)
+            self.code.emit(POP_TOP)
+            self.visit(expression)
+            ends.append(self.code.emit(JUMP))
+            self.code.patch(next_pattern)
+        else:
+            self.code.emit(POP_TOP)
+            self.code.emit(LOAD_CONST, self.code.add_constant(None))
+        for position in ends:
+            self.code.patch(position)
+
+    def match_table(self, arms, default):
+        # MATCH_TABLE jumps straight to the expression of the value, through a dict of the positions of each one
+        index = self.code.add_constant(None)
+        self.code.emit(MATCH_TABLE, index)
+        positions = {}
+        ends = []
+        for expression in [*arms.values(), default]:
+            if expression is not None and id(expression) not in positions:
+                positions[id(expression)] = len(self.code.instructions)
+                self.visit(expression)
+                ends.append(self.code.emit(JUMP))
+        no_match = self.code.emit(LOAD_CONST, self.code.add_constant(None))
+        for position in ends:
+            self.code.patch(position)
+
+        jumps = {value: positions[id(expression)] for value, expression in arms.items()}
+        self.code.constants[index] = (jumps, no_match if default is None else positions[id(default)])
+
+    def visit_IfThenElseNode(self, node):
+        # Once a branch has run, the other ones are jumped over
+        ends = []
+        for i, (condition, statements) in enumerate(zip(node.conditions, node.truthy_statements)):
+            self.visit(condition)
+            skip = self.code.emit(POP_JUMP_IF_FALSE)
+            self.block(statements)
+            if i < len(node.conditions) - 1 or node.else_statements:
+                ends.append(self.code.emit(JUMP))
+            self.code.patch(skip)
+
+        if node.else_statements:
+            self.block(node.else_statements)
+        for position in ends:
+            self.code.patch(position)
+        self.code.emit(LOAD_CONST, self.code.add_constant(None))
+
+    def visit_WhileNode(self, node):
+        start = len(self.code.instructions)
+        self.visit(node.condition)
+        end = self.code.emit(POP_JUMP_IF_FALSE)
+        self.block(node.statements)
+        self.code.emit(JUMP, start)
+        self.code.patch(end)
+        self.code.emit(LOAD_CONST, self.code.add_constant(None))
+
+    def visit_ForNode(self, node):
+        self.visit(node.start)
+        self.visit(node.end)
+        self.code.emit(FOR_RANGE, self.code.add_constant(node))
+        start = self.code.emit(FOR_ITER)
+        self.code.emit(STORE_FAST, node.slot)
+        self.block(node.statements)
+        self.code.emit(JUMP, start)
+        self.code.patch(start)
+        self.code.emit(LOAD_CONST, self.code.add_constant(None))
+
+    def visit_ReturnNode(self, node):
+        if node.tail:
+            self.call(node.value, TAIL_CALL)
+            self.code.emit(RETURN_VALUE)
+        elif self.depth:
+            self.visit(node.value)
+            self.code.emit(RETURN_VALUE)
+        else:
+            self.visit(node.value)
+            self.code.emit(POP_TOP)
+            self.program_exits.append(self.code.emit(JUMP))
+
+    def visit_FunctionNode(self, node):
+        # Functions skimmed by a lazy Parser are compiled once parsed, on their first call
+        if node.statements is not None:
+            self.body(node)
+        self.code.emit(MAKE_FUNCTION, self.code.add_constant(node))
+        self.code.emit(LOAD_CONST, self.code.add_constant(None))
+
+    def compile_function(self, node, depth):
+        """Compile the body of a function parsed after the program, `depth` is how many functions it is
+        declared in."""
+        self.depth = depth
+        self.body(node)
+        return node.code
+
+    def body(self, node):
+        enclosing = self.code
+        self.code = Code(node.id)
+        self.depth += 1
+        self.block(node.statements)
+        self.depth -= 1
+        self.code.emit(LOAD_CONST, self.code.add_constant(None))
+        self.code.emit(RETURN_VALUE)
+        node.code = self.code
+        self.code = enclosing
+
+    def visit_FunctionCallNode(self, node):
+        if node.native is not None:
+            for argument in node.arguments:
+                self.visit(argument)
+            self.code.emit(CALL_NATIVE, self.code.add_constant((node.native, len(node.arguments))))
+        else:
+            self.call(node, CALL_FUNCTION)
+
+    def call(self, node, call_opcode):
+        self.variable(node, LOAD_FAST, LOAD_GLOBAL, LOAD_DEREF)
+        builtin = self.code.emit(SETUP_CALL)
+        self.code.emit(CHECK_ARITY, len(node.arguments))
+        arguments_end = []
+        for i, argument in enumerate(node.arguments):
+            # Arguments the function doesn't declare are never evaluated
+            self.code.emit(ARG_GUARD, i)
+            arguments_end.append(self.code.emit(JUMP))
+            self.visit(argument)
+        for position in arguments_end:
+            self.code.patch(position)
+        self.code.emit(call_opcode)
+        end = self.code.emit(JUMP)
+
+        # The function turned out to be a builtin stored in a variable
+        self.code.patch(builtin)
+        for argument in node.arguments:
+            self.visit(argument)
+        self.code.emit(CALL_BUILTIN, len(node.arguments))
+        self.code.patch(end)
@@ -1,4 +1,5 @@
-from typing import Any, Dict, Optional
+from dataclasses import dataclass
+from typing import Any, List, Optional
 
 from src.ast import FunctionNode
 
@@ -7,36 +8,53 @@ class NameErrorException(Exception):
     pass
 
 
+class Unset:
+    """Value of the global variables whose `let` (or `fn`) didn't run yet: they are late bound (see Resolver),
+    reading one is an undeclared variable."""
+
+    def __repr__(self):
+        return "<unset>"
+
+
+UNSET = Unset()
+
+
 class Environment:
+    """A scope, its variables are stored by slot as computed by the Resolver."""
+
     parent: "Environment" = None
-    values: Dict[str, Any]
+    values: List[Any]
 
-    def __init__(self, parent: Optional["Environment"] = None) -> None:
+    def __init__(self, size: int = 0, parent: Optional["Environment"] = None) -> None:
         if parent is not None:
             self.parent = parent
-        self.values = {
-            "print": FunctionNode(None, "print", ["text"], []),
-            "input": FunctionNode(None, "input", ["text"], []),
-        }
-
-    def declare(self, key: str, value: Any = None) -> None:
-        if key in self.values:
-            raise NameErrorException(f"Variable already declared: {key}")
-        self.values[key] = value
-
-    def set(self, key: str, value: Any) -> None:
-        if key in self.values:
-            self.values[key] = value
-        elif self.parent is not None:
-            self.parent.set(key, value)
-        else:
-            raise NameErrorException(f"Undeclared variable: {key}")
-
-    def get(self, key: str) -> Any:
-        if key in self.values:
-            return self.values[key]
-
-        if self.parent is not None:
-            return self.parent.get(key)
-
-        raise NameErrorException(f"Undeclared variable: {key}")
+        # Slots of variables which aren't declared yet are nil
+        self.values = [None] * size
+
+    def grow(self, size: int) -> None:
+        """Make room for globals declared since the scope was created (new REPL lines), unset until declared."""
+        if size > len(self.values):
+            self.values.extend([UNSET] * (size - len(self.values)))
+
+    def ancestor(self, depth: int) -> "Environment":
+        env = self
+        for _ in range(depth):
+            env = env.parent
+        return env
+
+    def set(self, depth: int, slot: int, value: Any) -> None:
+        self.ancestor(depth).values[slot] = value
+
+    def get(self, depth: int, slot: int) -> Any:
+        return self.ancestor(depth).values[slot]
+
+
+@dataclass
+class Closure:
+    """A function value: the function and the scope it was declared in."""
+
+    function: FunctionNode
+    env: Environment
+
+    def __repr__(self):
+        return f"<fn {self.function.id}>"
@@ -0,0 +1,23 @@
+class RuntimeException(Exception):
+    pass
+
+
+class TypeError(RuntimeException):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class BudgetExceeded(RuntimeException):
+    """A limit of the Budget of a run was crossed. `usage` is what the run used when it was stopped."""
+
+    def __init__(self, message, usage):
+        details = [f"{usage['steps']} steps", f"{usage['seconds']:.3f}s", f"call depth {usage['depth']}"]
+        if usage["memory"] is not None:
+            details.append(f"memory +{usage['memory'] / 1024 / 1024:.1f} MB")
+        super().__init__(f"{message} ({', '.join(details)})")
+        self.message = message
+        self.usage = usage
+
+    def __reduce__(self):
+        # Raised in pmap workers, and pickled back to the parent
+        return type(self), (self.message, self.usage)
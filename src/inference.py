@@ -0,0 +1,368 @@
+import operator
+
+from src.ast import IfThenElseNode, ReturnNode, WildcardNode
+from src.exceptions import TypeError
+from src.rope import STRING_OPERATIONS
+from src.tokens import *
+from src.visitor import NodeVisitor
+
+
+# Types of values (the token types are taken). None means nothing is known yet: no value got there so far.
+INT_TYPE = "int"
+FLOAT_TYPE = "float"
+NUMBER_TYPE = "number"  # int or float
+BOOL_TYPE = "bool"
+STRING_TYPE = "string"
+NIL_TYPE = "nil"
+ANY_TYPE = "any"
+
+NUMBER_TYPES = (INT_TYPE, FLOAT_TYPE, NUMBER_TYPE)
+
+# Operations the engines run without checking their operands, once their types are proven
+OPERATIONS = {
+    PLUS: operator.add,
+    MINUS: operator.sub,
+    MUL: operator.mul,
+    DIV: operator.truediv,
+    MOD: operator.mod,
+    SUPEQUAL: operator.ge,
+    INFEQUAL: operator.le,
+    SUP: operator.gt,
+    INF: operator.lt,
+    EQUAL: operator.eq,
+    NOTEQUAL: operator.ne,
+}
+
+
+def join(a, b):
+    """Type of a value which is either of type `a` or of type `b`."""
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if a in NUMBER_TYPES and b in NUMBER_TYPES:
+        return NUMBER_TYPE
+    return ANY_TYPE
+
+
+def always_returns(statements):
+    """Whether a block can't get to its end without a return statement."""
+    if not statements or not statements.statements:
+        return False
+    last = statements.statements[-1]
+    if type(last) is ReturnNode:
+        return True
+    if type(last) is IfThenElseNode:
+        return always_returns(last.else_statements) and all(map(always_returns, last.truthy_statements))
+    return False
+
+
+class Scope:
+    def __init__(self):
+        # Slot -> type of every value written to it
+        self.types = {}
+        # Slot -> FunctionNode declared in it
+        self.functions = {}
+        # Slots assigned somewhere, the function they hold (if any) can't be relied on
+        self.assigned = set()
+        # Slots read as values: a function stored there may be called from anywhere
+        self.values = set()
+        # Slots declared by the body itself (not in an if or a loop), before anything reads them
+        self.declared = set()
+        # Slots which may be read before being set, they can be nil
+        self.unsafe = set()
+        # A function which isn't parsed yet (lazy Parser) can do anything with the variables it sees
+        self.opaque = False
+
+    def type(self, slot):
+        if self.opaque or slot in self.unsafe:
+            return ANY_TYPE
+        return self.types.get(slot)
+
+    def function(self, slot):
+        if self.opaque or slot in self.assigned or slot in self.unsafe:
+            return None
+        return self.functions.get(slot)
+
+
+class TypeInference(NodeVisitor):
+    """Finds the operations whose operands are known to be numbers (or booleans for `and`/`or`), which the
+    engines can then run without checking them, and the ones which are known to fail.
+
+    Types come from literals, and flow through variables, function returns and arguments. A variable has the
+    type of all the values written to it, as long as it can't be read before it is set: it has to be declared
+    by the body of its function (or by the program), not in an if or a loop. Function arguments get the type
+    of the values given at each call, when every call is known (the function is only called by name).
+
+    Types are joined until nothing changes, the BinaryOpNodes whose operands are proven get `checked` set
+    to False. The types only hold for a whole program, run in a single interpreter (not the REPL, where
+    the next line could change a variable).
+    """
+
+    def analyze(self, tree):
+        # First pass: scopes, functions, and which variables can be trusted
+        self.collecting = True
+        self.current = None
+        # (scope, slot) of the for loops whose body is being visited
+        self.iterating = set()
+        self.scopes = {}
+        self.stack = [Scope()]
+        self.program = self.stack[0]
+        self.body(tree)
+
+        # Arguments of functions called from places unknown can be anything
+        for scope in [self.program, *self.scopes.values()]:
+            for slot, function in scope.functions.items():
+                if function.statements is not None and (scope.function(slot) is None or slot in scope.values):
+                    self.scopes[id(function)].types.update((i, ANY_TYPE) for i in range(len(function.arguments)))
+
+        # Then the types, until they don't change
+        self.collecting = False
+        self.returns = {}
+        self.changed = True
+        while self.changed:
+            self.changed = False
+            self.stack = [self.program]
+            self.body(tree)
+
+        # Last pass, marking the operations
+        self.checking = True
+        self.stack = [self.program]
+        try:
+            self.body(tree)
+        finally:
+            self.checking = False
+
+    checking = False
+
+    def body(self, statements):
+        """Visit the statements of a function body or of the program, which run every time it does."""
+        for statement in statements.statements:
+            self.direct = statement
+            self.visit(statement)
+
+    def scope(self, depth):
+        return self.stack[-1 - depth]
+
+    def write(self, scope, slot, value_type):
+        if self.collecting:
+            return
+        joined = join(scope.types.get(slot), value_type)
+        if joined != scope.types.get(slot):
+            scope.types[slot] = joined
+            self.changed = True
+
+    def reference(self, depth, slot):
+        scope = self.scope(depth)
+        if self.collecting and slot not in scope.declared and (id(scope), slot) not in self.iterating:
+            scope.unsafe.add(slot)
+        return scope
+
+    def visit_StatementListNode(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+
+    def visit_NumNode(self, node):
+        return INT_TYPE if type(node.value) is int else FLOAT_TYPE
+
+    def visit_BooleanNode(self, node):
+        return BOOL_TYPE
+
+    def visit_StringNode(self, node):
+        return STRING_TYPE
+
+    def visit_NilNode(self, node):
+        return NIL_TYPE
+
+    def visit_WildcardNode(self, node):
+        return None
+
+    def visit_VariableNode(self, node):
+        scope = self.reference(node.depth, node.slot)
+        if self.collecting:
+            scope.values.add(node.slot)
+            return None
+        return scope.type(node.slot)
+
+    def visit_BinaryOpNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        operator_type = node.token.type
+        if self.checking:
+            self.check(node, left, right)
+        if operator_type in (AND, OR):
+            return BOOL_TYPE
+        if left is None or right is None:
+            return None
+        if left == STRING_TYPE and right == STRING_TYPE and operator_type in STRING_OPERATIONS:
+            return STRING_TYPE if operator_type == PLUS else BOOL_TYPE
+        # Operators apply to arrays too
+        if operator_type not in OPERATIONS or left not in NUMBER_TYPES or right not in NUMBER_TYPES:
+            return ANY_TYPE
+        if operator_type in COMPARISONS:
+            return BOOL_TYPE
+        if operator_type == DIV:
+            return FLOAT_TYPE
+        if left == INT_TYPE and right == INT_TYPE:
+            return INT_TYPE
+        if FLOAT_TYPE in (left, right):
+            return FLOAT_TYPE
+        return NUMBER_TYPE
+
+    def check(self, node, left, right):
+        """Mark `node` as safe to run unchecked, or raise the error it is bound to fail with."""
+        if node.token.type in (AND, OR):
+            proven = left == BOOL_TYPE and right == BOOL_TYPE
+            # The right operand isn't always computed
+            failing = left not in (None, ANY_TYPE, BOOL_TYPE)
+        else:
+            proven = node.token.type in OPERATIONS and left in NUMBER_TYPES and right in NUMBER_TYPES
+            failing = left not in (None, ANY_TYPE, *NUMBER_TYPES) or right not in (None, ANY_TYPE, *NUMBER_TYPES)
+            if node.token.type in STRING_OPERATIONS and left in (None, ANY_TYPE, STRING_TYPE):
+                # Strings go with strings, and aren't run unchecked: concatenations build a Rope
+                failing = failing and right not in (None, ANY_TYPE, STRING_TYPE)
+        if failing:
+            raise TypeError(f"Can't do {node.left.token.type} {node.token.value} {node.right.token.type}")
+        if proven:
+            node.checked = False
+
+    def visit_ComparisonNode(self, node):
+        types = [self.visit(operand) for operand in node.operands]
+        if None in types:
+            return None
+        if all(operand in NUMBER_TYPES for operand in types):
+            return BOOL_TYPE
+        if all(operand == STRING_TYPE for operand in types) and all(op in STRING_OPERATIONS for op in node.operators):
+            return BOOL_TYPE
+        # Comparisons of arrays give arrays
+        return ANY_TYPE
+
+    def visit_ArrayNode(self, node):
+        for element in node.elements:
+            self.visit(element)
+        return ANY_TYPE
+
+    def visit_IndexNode(self, node):
+        self.visit(node.value)
+        self.visit(node.index)
+        # Elements of arrays are numbers
+        return NUMBER_TYPE
+
+    def visit_UnaryOpNode(self, node):
+        value = self.visit(node.value)
+        if node.token.type == NOT:
+            return BOOL_TYPE
+        if value is None or value in NUMBER_TYPES:
+            return value
+        return ANY_TYPE
+
+    def visit_MatchNode(self, node):
+        self.visit(node.factor)
+        result = None
+        for pattern, expression in node.matches:
+            self.visit(pattern)
+            result = join(result, self.visit(expression))
+        if type(node.matches[-1][0]) is not WildcardNode:
+            result = join(result, NIL_TYPE)
+        return result
+
+    def visit_FunctionCallNode(self, node):
+        arguments = [self.visit(argument) for argument in node.arguments]
+        if node.native is not None:
+            return ANY_TYPE
+        scope = self.reference(node.depth, node.slot)
+        if self.collecting:
+            return None
+        function = scope.function(node.slot)
+        if function is None or function.statements is None:
+            return ANY_TYPE
+        for slot, argument in enumerate(arguments[: len(function.arguments)]):
+            self.write(self.scopes[id(function)], slot, argument)
+        return self.returns.get(id(function))
+
+    def visit_IfThenElseNode(self, node):
+        for condition, statements in zip(node.conditions, node.truthy_statements):
+            self.visit(condition)
+            self.visit(statements)
+        if node.else_statements:
+            self.visit(node.else_statements)
+
+    def visit_WhileNode(self, node):
+        self.visit(node.condition)
+        self.visit(node.statements)
+
+    def visit_ForNode(self, node):
+        start = self.visit(node.start)
+        end = self.visit(node.end)
+        scope = self.stack[-1]
+        if self.collecting:
+            scope.assigned.add(node.slot)
+        elif self.checking and not {start, end} <= {None, ANY_TYPE, INT_TYPE, NUMBER_TYPE}:
+            raise TypeError(f"Can't do {node.start.token.type} .. {node.end.token.type}")
+        self.write(scope, node.slot, INT_TYPE)
+        # The body only runs once the variable is set. It can be nil after the loop when the loop declares it.
+        loop = (id(scope), node.slot)
+        nested = loop in self.iterating
+        self.iterating.add(loop)
+        self.visit(node.statements)
+        if not nested:
+            self.iterating.discard(loop)
+
+    def visit_DeclarationNode(self, node):
+        value = self.visit(node.value)
+        scope = self.stack[-1]
+        if self.collecting:
+            if node is self.direct:
+                scope.declared.add(node.slot)
+            else:
+                scope.unsafe.add(node.slot)
+        self.write(scope, node.slot, value)
+
+    def visit_AssignmentNode(self, node):
+        value = self.visit(node.value)
+        scope = self.reference(node.depth, node.slot)
+        if self.collecting:
+            scope.assigned.add(node.slot)
+        self.write(scope, node.slot, value)
+
+    def visit_ReturnNode(self, node):
+        value = self.visit(node.value)
+        if self.current is not None:
+            self.returned(self.current, value)
+
+    def returned(self, function, value_type):
+        if self.collecting:
+            return
+        joined = join(self.returns.get(id(function)), value_type)
+        if joined != self.returns.get(id(function)):
+            self.returns[id(function)] = joined
+            self.changed = True
+
+    def visit_FunctionNode(self, node):
+        scope = self.stack[-1]
+        if self.collecting:
+            if node.slot in scope.functions:
+                # Defined twice, calls could reach either of them
+                scope.assigned.add(node.slot)
+            scope.functions[node.slot] = node
+            if node is self.direct:
+                scope.declared.add(node.slot)
+            else:
+                scope.unsafe.add(node.slot)
+            if node.statements is None:
+                for enclosing in self.stack:
+                    enclosing.opaque = True
+                return
+            self.scopes[id(node)] = Scope()
+            self.scopes[id(node)].declared.update(range(len(node.arguments)))
+        elif node.statements is None:
+            return
+
+        enclosing, direct = self.current, self.direct
+        self.current = node
+        self.stack.append(self.scopes[id(node)])
+        self.body(node.statements)
+        self.stack.pop()
+        self.current, self.direct = enclosing, direct
+        if not always_returns(node.statements):
+            self.returned(node, NIL_TYPE)
@@ -1,88 +1,206 @@
-from src.ast import FunctionNode, NumNode, StringNode
-from src.environment import Environment
+import operator
+import sys
+import threading
+
+from src.ast import WildcardNode, match_table
+from src.builtins import NativeFunction
+from src.environment import UNSET, Closure, Environment, NameErrorException
+from src.exceptions import RuntimeException, TypeError
+from src.inference import OPERATIONS, TypeInference
+from src.memo import MemoCache
+from src.numarray import ARRAY_ALLOCATIONS, ARRAY_OPERATIONS, UNARY_ARRAY_OPERATIONS, NumArray, is_operand
+from src.output import StreamOutput
+from src.parser import Parser
+from src.purity import PurityAnalyzer
+from src.resolver import Resolver
+from src.rope import STRING_ALLOCATIONS, STRING_OPERATIONS, Rope, is_string, pending
+from src.scanner import Scanner
 from src.token import *
-from rich import print
-import readline  # Necessary to have a nice python input()
+from src.visitor import NodeVisitor
 
 
-class RuntimeException(Exception):
-    pass
+class TailCall:
+    """Returned instead of calling the function, when a function returns the result of a call."""
 
+    __slots__ = ("closure", "args")
 
-class TypeError(RuntimeException):
-    def __init__(self, message):
-        super().__init__(message)
+    def __init__(self, closure, args):
+        self.closure = closure
+        self.args = args
 
 
-class NodeVisitor:
-    def visit(self, node):
-        method_name = "visit_" + type(node).__name__
-        visitor = getattr(self, method_name, self.unhandled_visit)
-        return visitor(node)
+# C stack a Python frame of the tree walker can take: about 600 bytes measured on Python 3.8 (3.11 and later
+# mostly don't use the C stack for calls between Python functions), with some margin
+FRAME_SIZE = 1024
 
-    def unhandled_visit(self, node):
-        raise Exception("InterpreterError: No visit_{} method".format(type(node).__name__))
+
+def run_with_stack(function, *args, stack_size=1024 * 1024 * 1024, recursion_limit=None):
+    """Call `function` in a thread with a large stack, and return its result.
+
+    The recursion limit is raised to what the stack can hold, `stack_size // FRAME_SIZE` frames by default
+    (about a million for 1 GiB, a Huil call takes 7 or more in the tree walker): deeply recursive Huil programs
+    go far deeper than with Python's default limit, and going past it raises a RecursionError instead of
+    overflowing the stack and crashing the process."""
+    if recursion_limit is None:
+        recursion_limit = stack_size // FRAME_SIZE
+    result = []
+    error = []
+
+    def target():
+        try:
+            result.append(function(*args))
+        except BaseException as e:
+            error.append(e)
+
+    previous_stack_size = threading.stack_size(stack_size)
+    previous_recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(recursion_limit)
+    try:
+        # Not waited for at exit, when Ctrl-C stopped the wait for it
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join()
+    finally:
+        threading.stack_size(previous_stack_size)
+        sys.setrecursionlimit(previous_recursion_limit)
+    if error:
+        raise error[0]
+    return result[0]
+
+
+# Types of the values of NumNode, StringNode and BooleanNode
+LITERAL_TYPES = (int, float, str, bool)
+
+UNARY_OPERATIONS = {
+    NOT: operator.not_,
+    PLUS: operator.pos,
+    MINUS: operator.neg,
+}
 
 
 class Interpreter(NodeVisitor):
-    def __init__(self):
-        self.env = Environment()
+    def __init__(self, memo_size=0, optimizer=None, infer=True, output=None, budget=None):
+        """`memo_size`: how many results to remember for each pure function, 0 to disable memoization.
+        `optimizer`: what the program was optimized with, if it was, for function bodies parsed lazily.
+        `infer`: whether to prove the types of operands ahead of time (only for whole programs).
+        `output`: where `print` writes (see src/output.py), buffered stdout by default.
+        `budget`: limits of each run (see src/budget.py), None to let programs run as long as they want."""
+        self.memo_size = memo_size
+        self.optimizer = optimizer
+        self.infer = infer
+        self.output = StreamOutput() if output is None else output
+        self.budget = budget
+        # Operators on arrays and strings, by token type
+        self.array_operations = ARRAY_OPERATIONS
+        self.unary_array_operations = UNARY_ARRAY_OPERATIONS
+        self.string_operations = STRING_OPERATIONS
+        if budget is not None and budget.max_memory is not None:
+            # They can allocate a lot at once, it is checked against the budget first
+            self.array_operations = budget.guard(ARRAY_OPERATIONS, ARRAY_ALLOCATIONS)
+            self.unary_array_operations = budget.guard(UNARY_ARRAY_OPERATIONS, ARRAY_ALLOCATIONS)
+            self.string_operations = budget.guard(STRING_OPERATIONS, STRING_ALLOCATIONS)
+        self.memoized = []
+        self.purity = PurityAnalyzer()
+        self.resolver = Resolver()
+        self.globals = Environment()
+        self.env = self.globals
+        # Set by a return statement, until the function call (or the program) it returns from is left
+        self.returning = False
 
     def visit_BinaryOpNode(self, node):
+        if not node.checked:
+            # Operands proven to have the right types by the TypeInference. Inlined, deep recursions
+            # shouldn't take one more Python frame per call
+            if node.token.type == AND:
+                return self.visit(node.left) and self.visit(node.right)
+            if node.token.type == OR:
+                return self.visit(node.left) or self.visit(node.right)
+            return OPERATIONS[node.token.type](self.visit(node.left), self.visit(node.right))
+
         left = self.visit(node.left)
-        right = self.visit(node.right)
 
         if node.token.type in (AND, OR):
-            if (type(left) != bool) or (type(right) != bool):
+            if type(left) != bool:
                 raise TypeError(f"Can't do {node.left.token.type} {node.token.value} {node.right.token.type}")
+            # `false and ...` and `true or ...`: the right operand isn't computed
+            if left == (node.token.type == OR):
+                return left
+            right = self.visit(node.right)
+            if type(right) != bool:
+                raise TypeError(f"Can't do {node.left.token.type} {node.token.value} {node.right.token.type}")
+            return right
 
-            if node.token.type == AND:
-                return left and right
-            elif node.token.type == OR:
-                return left or right
-
-        if (type(left) != int and type(left) != float) or (type(right) != int and type(right) != float):
+        right = self.visit(node.right)
+        # Quickened: the node remembers the operand types it last saw, operands of the same types are
+        # known to be fine and go straight to the operator function
+        quick = node.quick
+        if quick is not None and type(left) is quick[0] and type(right) is quick[1]:
+            return quick[2](left, right)
+
+        function = self.operation(node.token.type, left, right)
+        if function is None:
             raise TypeError(f"Can't do {node.left.token.type} {node.token.value} {node.right.token.type}")
+        # Specialized again when the types change
+        node.quick = (type(left), type(right), function)
+        return function(left, right)
 
-        if node.token.type == PLUS:
-            return left + right
-        elif node.token.type == MINUS:
-            return left - right
-        elif node.token.type == MUL:
-            return left * right
-        elif node.token.type == DIV:
-            return left / right
-        elif node.token.type == MOD:
-            return left % right
-        elif node.token.type == SUPEQUAL:
-            return left >= right
-        elif node.token.type == INF:
-            return left < right
-        elif node.token.type == SUP:
-            return left > right
-        elif node.token.type == EQUAL:
-            return left == right
-        elif node.token.type == NOTEQUAL:
-            return left != right
-        elif node.token.type == INFEQUAL:
-            return left <= right
+    def operation(self, operator_type, left, right):
+        """Function of the operator for these operands, None if they can't go together. Shared by both engines,
+        and by each comparison of a chain."""
+        if (type(left) != int and type(left) != float) or (type(right) != int and type(right) != float):
+            if is_string(left) and is_string(right) and operator_type in STRING_OPERATIONS:
+                return self.string_operations[operator_type]
+            if not (is_operand(left) and is_operand(right)):
+                return None
+            # There's an array, the operation applies to each of its elements
+            return self.array_operations[operator_type]
+        return OPERATIONS[operator_type]
+
+    def visit_ComparisonNode(self, node):
+        left = self.visit(node.operands[0])
+        for i, comparison in enumerate(node.operators):
+            right = self.visit(node.operands[i + 1])
+            function = self.operation(comparison, left, right)
+            if function is None:
+                left_type, right_type = node.operands[i].token.type, node.operands[i + 1].token.type
+                raise TypeError(f"Can't do {left_type} {COMPARISONS[comparison]} {right_type}")
+            result = function(left, right)
+            # Like `and`, the rest isn't computed once the result is known
+            if not result:
+                return result
+            left = right
+        return result
 
     def visit_UnaryOpNode(self, node):
         value = self.visit(node.value)
+        quick = node.quick
+        if quick is not None and type(value) is quick[0]:
+            return quick[1](value)
 
-        if type(value) != bool:
+        function = self.unary_operation(node.token.type, value)
+        if function is None:
             raise TypeError(f"Can't do {node.token.value} {value}")
-
-        if node.token.type == NOT:
-            return not value
-
+        node.quick = (type(value), function)
+        return function(value)
+
+    def unary_operation(self, operator_type, value):
+        """Function of the unary operator for this operand, None if it can't take it. Shared by both engines."""
+        if operator_type == NOT:
+            return UNARY_OPERATIONS[NOT] if type(value) == bool else None
+        if type(value) is NumArray:
+            return self.unary_array_operations[operator_type]
         if type(value) != int and type(value) != float:
-            raise TypeError(f"Can't do {node.token.value} {value}")
+            return None
+        return UNARY_OPERATIONS[operator_type]
+
+    def visit_ArrayNode(self, node):
+        return NumArray.of([self.visit(element) for element in node.elements])
 
-        if node.token.type == PLUS:
-            return value
-        elif node.token.type == MINUS:
-            return -value
+    def visit_IndexNode(self, node):
+        value = self.visit(node.value)
+        if type(value) is not NumArray:
+            raise TypeError(f"Can't index {node.value.token.type}")
+        return value.get(self.visit(node.index))
 
     def visit_NilNode(self, node):
         return None
@@ -97,88 +215,222 @@ class Interpreter(NodeVisitor):
         return node.value
 
     def visit_MatchNode(self, node):
+        if node.table is None:
+            # Literal patterns are looked up in a dict, the other ones are computed and compared in turn
+            node.table = match_table(node) or False
         value = self.visit(node.factor)
-
-        for match in node.matches:
-            if match[0].value == "*":
-                return self.visit(match[1])
-            if self.visit(match[0]) == value:
-                return self.visit(match[1])
+        if type(value) is Rope:
+            value = self.flatten(value)
+
+        if node.table:
+            arms, default = node.table
+            # Other values (functions) aren't equal to any literal, and can't always be hashed
+            expression = arms.get(value, default) if type(value) in LITERAL_TYPES else default
+            return None if expression is None else self.visit(expression)
+
+        for pattern, expression in node.matches:
+            if type(pattern) is WildcardNode or self.visit(pattern) == value:
+                return self.visit(expression)
         return None
 
+    def flatten(self, rope):
+        """`rope` as a `str`, the memory it takes checked against the budget."""
+        if self.budget is not None:
+            self.budget.allocate(pending(rope))
+        return rope.flatten()
+
     def visit_FunctionCallNode(self, node):
-        function = self.env.get(node.id)
-
-        if function.id == "print":
-            print(self.visit(node.arguments[0]))
-            return
-
-        if function.id == "input":
-            # TODO It's probably the users responsability to transform it to int ou float
-            if len(node.arguments) > 0:
-                text = input(self.visit(node.arguments[0]))
-            else:
-                text = input()
-            # https://nbviewer.org/github/rasbt/One-Python-benchmark-per-day/blob/master/ipython_nbs/day6_string_is_number.ipynb?create=1
-            if text.isdigit():
-                return self.visit(NumNode(Token(INTEGER, text, 0, 0)))
-            if text.replace(".", "", 1).isdigit():
-                return self.visit(NumNode(Token(FLOAT, text, 0, 0)))
-            return self.visit(StringNode(None, text))
+        if node.native is not None:
+            return node.native.call(self, [self.visit(argument) for argument in node.arguments])
 
-        # We save the previous state before we start adding scoped variables
-        previous_state = self.env
-        self.env = Environment(previous_state)
+        function = self.env.get(node.depth, node.slot)
+        if type(function) is NativeFunction:
+            return function.call(self, [self.visit(argument) for argument in node.arguments])
+        if function is UNSET:
+            raise NameErrorException(f"Undeclared variable: {node.id}")
+
+        return self.call(function, self.arguments(function, node))
 
-        fn_args_count = len(function.arguments)
+    def arguments(self, closure, node):
+        """Evaluate the arguments of a call, in the caller's scope."""
+        fn_args_count = len(closure.function.arguments)
         fn_call_args_count = len(node.arguments)
         if fn_args_count > fn_call_args_count:
-            raise TypeError(f"Missing arguments {function.arguments[fn_args_count-fn_call_args_count-1:]}")
+            raise TypeError(f"Missing arguments {closure.function.arguments[fn_args_count-fn_call_args_count-1:]}")
         # We son't care about extra fn call arguments
+        return [self.visit(node.arguments[i]) for i in range(fn_args_count)]
 
-        for i in range(fn_args_count):
-            self.env.declare(function.arguments[i], self.visit(node.arguments[i]))
-
-        returned = self.visit(
-            self.env.get(node.id).statements,
-        )
+    def call(self, closure, args):
+        # We save the previous state before we start adding scoped variables
+        previous_state = self.env
+        # Memoized calls waiting for the result, the functions of a chain of tail calls all return the same
+        pending = None
+        budget = self.budget
+        if budget is not None:
+            budget.enter(budget.depth + 1)
+        while True:
+            if budget is not None:
+                budget.step()
+            function = closure.function
+            if function.memo is not None:
+                key = MemoCache.key(args)
+                if key is not None:
+                    hit, returned = function.memo.get(key)
+                    if hit:
+                        break
+                    if pending is None:
+                        pending = []
+                    pending.append((function.memo, key))
+
+            if function.statements is None:
+                self.load(function)
+            # The arguments are the first variables of the new scope
+            self.env = Environment(function.scope_size, closure.env)
+            self.env.values[: len(args)] = args
+            returned = self.visit(function.statements)
+            self.returning = False
+            # `return f(...)` hands us the next call, which reuses this Python frame
+            if type(returned) is not TailCall:
+                break
+            closure, args = returned.closure, returned.args
         self.env = previous_state
+        if budget is not None:
+            budget.depth -= 1
+
+        if pending is not None:
+            for memo, key in pending:
+                memo.put(key, returned)
         return returned
 
+    def load(self, function):
+        """Parse and resolve the body of a function skimmed by a lazy Parser, on its first call."""
+        parser = Parser(Scanner(function.source, line=function.line), lazy=True)
+        statements = parser.statements(block=True)
+        # Skimming only checks so much, the block may end before the body does
+        parser.eat(EOF)
+        if self.optimizer is not None:
+            statements = self.optimizer.optimize(statements)
+        function.statements = statements
+        self.resolver.resolve_function(function)
+        self.link()
+        function.source = None
+
     def visit_IfThenElseNode(self, node):
+        # The first branch whose condition holds is the only one to run
         for i in range(len(node.conditions)):
-            res = self.visit(node.conditions[i])
-            if res:
-                self.visit(node.truthy_statements[i])
+            if self.visit(node.conditions[i]):
+                return self.visit(node.truthy_statements[i])
 
         if node.else_statements:
-            self.visit(node.else_statements)
+            return self.visit(node.else_statements)
 
     def visit_WhileNode(self, node):
+        budget = self.budget
         while self.visit(node.condition):
-            self.visit(node.statements)
+            if budget is not None:
+                budget.step()
+            returned = self.visit(node.statements)
+            if self.returning:
+                return returned
+
+    def visit_ForNode(self, node):
+        start = self.visit(node.start)
+        end = self.visit(node.end)
+        if type(start) is not int or type(end) is not int:
+            raise TypeError(f"Can't do {node.start.token.type} .. {node.end.token.type}")
+        # A Python loop, the variable is set straight in its slot of the current scope
+        values = self.env.values
+        slot = node.slot
+        statements = node.statements
+        budget = self.budget
+        for value in range(start, end):
+            if budget is not None:
+                budget.step()
+            values[slot] = value
+            returned = self.visit(statements)
+            if self.returning:
+                return returned
 
     def visit_DeclarationNode(self, node):
-        self.env.declare(node.id, self.visit(node.value))
+        self.env.values[node.slot] = self.visit(node.value)
 
     def visit_AssignmentNode(self, node):
-        self.env.set(node.id, self.visit(node.value))
+        self.env.set(node.depth, node.slot, self.visit(node.value))
 
     def visit_VariableNode(self, node):
-        return self.env.get(node.id)
+        if node.depth == 0:
+            value = self.env.values[node.slot]
+        else:
+            value = self.env.get(node.depth, node.slot)
+        if value is UNSET:
+            raise NameErrorException(f"Undeclared variable: {node.id}")
+        return value
 
     def visit_ReturnNode(self, node):
-        return self.visit(node.value)
+        value = None
+        if node.tail:
+            function = self.env.get(node.value.depth, node.value.slot)
+            if type(function) is Closure:
+                value = TailCall(function, self.arguments(function, node.value))
+        if value is None:
+            value = self.visit(node.value)
+        self.returning = True
+        return value
 
     def visit_FunctionNode(self, node):
-        self.env.declare(node.id, node)
+        self.env.values[node.slot] = Closure(node, self.env)
 
     def visit_StatementListNode(self, node):
         for statement in node.statements:
-            if statement.token.type == RETURN:
-                return self.visit(statement)
-            self.visit(statement)
+            returned = self.visit(statement)
+            if self.returning:
+                return returned
+
+    def prepare(self, tree):
+        """Resolve the variables of a freshly parsed program, before running it in the global scope."""
+        self.resolver.resolve(tree)
+        self.link()
+        if self.infer:
+            TypeInference().analyze(tree)
+        # Pure functions can be memoized, and run in parallel by pmap
+        pure = self.purity.analyze(tree, self.resolver.natives)
+        # Functions of previous programs (REPL lines) which aren't pure anymore, their results could change
+        for function in self.memoized:
+            if not function.pure:
+                function.memo = None
+        self.memoized = [function for function in self.memoized if function.pure]
+        if self.memo_size:
+            for function in pure:
+                function.memo = MemoCache(self.memo_size)
+                self.memoized.append(function)
+        self.env = self.globals
+        self.returning = False
+        if self.budget is not None:
+            self.budget.start()
+
+    def link(self):
+        """Make room for the globals found by the Resolver, and put the builtins it found in their slots."""
+        self.globals.grow(self.resolver.global_count)
+        for slot, native in self.resolver.natives.items():
+            self.globals.values[slot] = native
+
+    def undeclared(self, slot):
+        """The error of reading the global in `slot` before its declaration ran."""
+        name = next(name for name, global_slot in self.resolver.globals.items() if global_slot == slot)
+        return NameErrorException(f"Undeclared variable: {name}")
+
+    def run(self, tree):
+        self.prepare(tree)
+        try:
+            # Each Huil call takes a few Python frames, deep recursions need more stack than the main thread has
+            run_with_stack(self.visit, tree)
+        except RecursionError:
+            raise RuntimeException("Maximum recursion depth exceeded")
+        finally:
+            self.returning = False
+            self.output.flush()
+            if self.budget is not None:
+                self.budget.stop()
 
     def interpret(self, parser):
-        tree = parser.parse()
-        self.visit(tree)
+        self.run(parser.parse())
@@ -30,6 +30,13 @@ class Lexer:
         else:
             return self.text[self.pos + char_number]
 
+    def peek_token(self):
+        """The next token, which get_next_token returns again."""
+        state = self.pos, self.current_char, self.line, self.column
+        token = self.get_next_token()
+        self.pos, self.current_char, self.line, self.column = state
+        return token
+
     def skip_whitespace(self):
         while self.current_char is not None and self.current_char.isspace():
             self.advance()
@@ -41,7 +48,10 @@ class Lexer:
     def number(self):
         """Return a (multidigit) integer of float consumed from the input."""
         result = ""
-        while self.current_char is not None and (self.current_char.isdigit() or self.current_char == "."):
+        # `1..5` is a range, not a float
+        while self.current_char is not None and (
+            self.current_char.isdigit() or (self.current_char == "." and self.peek() != ".")
+        ):
             result += self.current_char
             self.advance()
 
@@ -64,14 +74,14 @@ class Lexer:
     def id(self):
         initial_col = self.column
         result = ""
-        while self.current_char is not None and self.current_char.isalnum():
+        while self.current_char is not None and (self.current_char.isalnum() or self.current_char == "_"):
             result += self.current_char
             self.advance()
 
-        token = RESERVED_KEYWORDS.get(result, Token(ID, result, self.line, self.column))
-        token.line = self.line
-        token.column = initial_col
-        return token
+        keyword = RESERVED_KEYWORDS.get(result)
+        if keyword is not None:
+            return Token(keyword[0], keyword[1], self.line, initial_col)
+        return Token(ID, result, self.line, initial_col)
 
     def get_next_token(self):
         """Lexical analyzer (also known as scanner or tokenizer)
@@ -95,7 +105,7 @@ class Lexer:
             if self.current_char.isdigit():
                 return self.number()
 
-            if self.current_char.isalpha():
+            if self.current_char.isalpha() or self.current_char == "_":
                 return self.id()
 
             if self.current_char == '"':
@@ -129,6 +139,14 @@ class Lexer:
                 self.advance()
                 return Token(RPAREN, ")", self.line, self.column)
 
+            if self.current_char == "[":
+                self.advance()
+                return Token(LBRACKET, "[", self.line, self.column)
+
+            if self.current_char == "]":
+                self.advance()
+                return Token(RBRACKET, "]", self.line, self.column)
+
             if self.current_char == "-":
                 self.advance()
                 if self.current_char == ">":
@@ -176,6 +194,10 @@ class Lexer:
                 self.advance()
                 return Token(PIPE, "|", self.line, self.column)
 
+            if self.current_char == "." and self.peek() == ".":
+                self.advance(2)
+                return Token(RANGE, "..", self.line, self.column)
+
             self.error()
 
         return Token(EOF, None, self.line, self.column)
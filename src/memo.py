@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+
+class MemoCache:
+    """Results of a pure function, by arguments. Keeps the `size` most recently used ones."""
+
+    def __init__(self, size):
+        self.size = size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(args):
+        """The cache key of a call, or None if an argument can't be hashed.
+
+        Types are part of the key, as `1`, `1.0` and `true` are equal but don't give the same results.
+        """
+        key = (tuple(args), tuple(map(type, args)))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        """Return (True, result) on a hit, (False, None) otherwise."""
+        if key in self.results:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return True, self.results[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, result):
+        self.results[key] = result
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return (
+            f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+            f"{len(self.results)}/{self.size} cached"
+        )
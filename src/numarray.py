@@ -0,0 +1,128 @@
+import operator
+from array import array
+from itertools import repeat
+
+from src.exceptions import RuntimeException, TypeError
+from src.tokens import *
+
+
+# Typecodes of the arrays: 64 bits ints, or doubles as soon as there is a float
+INTS = "q"
+FLOATS = "d"
+# Bytes of an element, for both
+ITEM_SIZE = 8
+
+
+class NumArray:
+    """Huil array: numbers, all ints or all floats, stored in a compact `array.array`.
+
+    Arrays are values, like numbers: operators give a new array, elements can't be assigned. Arithmetic and
+    comparisons apply to each element at once (see `broadcast`), comparisons giving arrays of 0 and 1.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def of(cls, values):
+        """Array of a list of Huil values, which have to be numbers."""
+        typecode = INTS
+        for value in values:
+            if type(value) is float:
+                typecode = FLOATS
+            elif type(value) is not int:
+                raise TypeError(f"Can't put {value!r} in an array")
+        return cls.build(typecode, values)
+
+    @classmethod
+    def build(cls, typecode, values):
+        try:
+            return cls(array(typecode, values))
+        except OverflowError:
+            raise RuntimeException("Int too large for an array")
+
+    def get(self, index):
+        if type(index) is not int:
+            raise TypeError(f"Can't index an array with {index!r}")
+        if not 0 <= index < len(self.data):
+            raise RuntimeException(f"Index {index} out of an array of {len(self.data)} elements")
+        return self.data[index]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"[{', '.join(map(repr, self.data))}]"
+
+
+def broadcast(function, typecode=None):
+    """`function` of 2 numbers, as a function of arrays and numbers: applied to each pair of elements, a number
+    going with every element of the array. It runs in a single call to `map`, not in a Huil loop.
+
+    The result is an array of `typecode`, by default floats if an operand is a float (array), ints otherwise.
+    """
+
+    def operation(left, right):
+        left_array, right_array = type(left) is NumArray, type(right) is NumArray
+        if left_array and right_array:
+            if len(left.data) != len(right.data):
+                raise TypeError(f"Can't combine arrays of {len(left.data)} and {len(right.data)} elements")
+            values = map(function, left.data, right.data)
+        elif left_array:
+            values = map(function, left.data, repeat(right))
+        else:
+            values = map(function, repeat(left), right.data)
+
+        result_typecode = typecode
+        if result_typecode is None:
+            floats = (left_array and left.data.typecode == FLOATS) or (right_array and right.data.typecode == FLOATS)
+            result_typecode = FLOATS if floats or type(left) is float or type(right) is float else INTS
+        return NumArray.build(result_typecode, values)
+
+    return operation
+
+
+def is_operand(value):
+    """Whether `value` can be used by an operator applied to arrays."""
+    return type(value) is NumArray or type(value) is int or type(value) is float
+
+
+def unary(function):
+    """`function` of a number, applied to each element of an array."""
+
+    def operation(value):
+        return NumArray.build(value.data.typecode, map(function, value.data))
+
+    return operation
+
+
+# Operators applied to arrays, by token type
+ARRAY_OPERATIONS = {
+    PLUS: broadcast(operator.add),
+    MINUS: broadcast(operator.sub),
+    MUL: broadcast(operator.mul),
+    DIV: broadcast(operator.truediv, FLOATS),
+    MOD: broadcast(operator.mod),
+    SUPEQUAL: broadcast(operator.ge, INTS),
+    INFEQUAL: broadcast(operator.le, INTS),
+    SUP: broadcast(operator.gt, INTS),
+    INF: broadcast(operator.lt, INTS),
+    EQUAL: broadcast(operator.eq, INTS),
+    NOTEQUAL: broadcast(operator.ne, INTS),
+}
+
+UNARY_ARRAY_OPERATIONS = {
+    PLUS: unary(operator.pos),
+    MINUS: unary(operator.neg),
+}
+
+
+def allocation(*operands):
+    """Bytes of the array an operator makes from `operands`, for memory budgets."""
+    return ITEM_SIZE * max(len(operand.data) for operand in operands if type(operand) is NumArray)
+
+
+# What the operators allocate, by token type (see Budget.guard)
+ARRAY_ALLOCATIONS = dict.fromkeys(ARRAY_OPERATIONS, allocation)
@@ -0,0 +1,75 @@
+# Instructions understood by the VM. Each one is stored as two consecutive ints in Code.instructions:
+# the opcode, then its argument (0 when the instruction doesn't need one).
+#
+# Stack
+LOAD_CONST = 0
+POP_TOP = 1
+DUP_TOP = 2
+ROT_TWO = 3
+ROT_THREE = 4
+
+# Variables, by slot in the current or the global scope, or by (depth, slot) address stored in the constants
+LOAD_FAST = 10
+STORE_FAST = 11
+LOAD_GLOBAL = 12
+STORE_GLOBAL = 13
+LOAD_DEREF = 14
+STORE_DEREF = 15
+
+# Operators, the argument is the index of the BinaryOpNode/UnaryOpNode in the constants (for error messages)
+BINARY_ADD = 20
+BINARY_SUBTRACT = 21
+BINARY_MULTIPLY = 22
+BINARY_DIVIDE = 23
+BINARY_MODULO = 24
+COMPARE_SUPEQUAL = 25
+COMPARE_INF = 26
+COMPARE_SUP = 27
+COMPARE_EQUAL = 28
+COMPARE_NOTEQUAL = 29
+COMPARE_INFEQUAL = 30
+# Element of an array, the argument is the index of the IndexNode in the constants
+BINARY_SUBSCR = 31
+# Array of the values on top of the stack, the argument is how many they are
+BUILD_ARRAY = 32
+UNARY_NOT = 33
+UNARY_POSITIVE = 34
+UNARY_NEGATIVE = 35
+MATCH_EQUAL = 36
+# Operand of `and`/`or` which isn't a boolean
+CHECK_BOOL = 37
+# Operator whose operands are proven to be numbers, the argument is the index of its function in the constants
+BINARY_UNCHECKED = 38
+# Operator quickened for the operand types it last saw, the argument is the index of a
+# [left type, right type, function, index of the BinaryOpNode] list in the constants
+BINARY_QUICK = 39
+# Same thing for a unary operator, with a [operand type, function, index of the UnaryOpNode] list
+UNARY_QUICK = 19
+
+# Control flow, the argument is an absolute index in Code.instructions
+JUMP = 40
+POP_JUMP_IF_FALSE = 41
+JUMP_IF_FALSE_OR_POP = 42
+JUMP_IF_TRUE_OR_POP = 43
+# Pops a value and jumps to its position in a (value -> position, default position) table from the constants
+MATCH_TABLE = 44
+# Pushes the next value of the iterator on the stack, or pops the iterator and jumps once it is exhausted
+FOR_ITER = 45
+# Replaces the start and end of a range on the stack by an iterator over it, the argument is the index of the
+# ForNode in the constants (for error messages)
+FOR_RANGE = 46
+
+# Functions
+MAKE_FUNCTION = 50
+SETUP_CALL = 51
+CHECK_ARITY = 52
+ARG_GUARD = 53
+CALL_FUNCTION = 55
+CALL_BUILTIN = 56
+CALL_NATIVE = 58
+RETURN_VALUE = 57
+TAIL_CALL = 59
+
+HALT = 60
+
+OPNAMES = {value: name for name, value in dict(globals()).items() if name.isupper() and isinstance(value, int)}
@@ -0,0 +1,191 @@
+from src.ast import *
+from src.exceptions import RuntimeException
+from src.interpreter import Interpreter
+from src.rope import Rope
+from src.token import *
+from src.visitor import NodeVisitor
+
+
+CONSTANT_NODES = (NumNode, BooleanNode, StringNode)
+
+
+def constant_node(token, value):
+    """Build the literal node holding `value`, positioned at `token`."""
+    if type(value) is Rope:
+        value = value.flatten()
+    if type(value) == bool:
+        return BooleanNode(Token(BOOLEAN, value, token.line, token.column), value)
+    if type(value) == int:
+        return NumNode(Token(INTEGER, value, token.line, token.column), value)
+    if type(value) == float:
+        return NumNode(Token(FLOAT, value, token.line, token.column), value)
+    if type(value) == str:
+        return StringNode(Token(STRING, value, token.line, token.column), value)
+    return None
+
+
+def declares(node):
+    """Whether running `node` declares names (variables, loop variables or functions) in the current scope."""
+    if type(node) in (DeclarationNode, FunctionNode, ForNode):
+        return True
+    return any(declares(child) for child in iter_child_nodes(node))
+
+
+class Optimizer(NodeVisitor):
+    """Optional pass simplifying the tree returned by Parser.parse():
+
+    - operations on literals are computed once, here (`2 * 60 * 60` becomes `7200`)
+    - branches of an if whose condition is always false (or following a condition always true), and loops
+      which never run, are removed
+    - `and`/`or` whose left operand is a literal deciding the result are replaced by it
+    - statements following a return, or expressions computing a literal for nothing, are removed
+
+    Blocks don't create scopes: what a block declares can be used after it, even when the block never runs
+    (the variable is nil). Blocks declaring names are kept, and never run.
+
+    Operations are computed by the Interpreter itself, so their result is exactly what running them would
+    give. The ones which would fail (`1 + true`, `1 / 0`) are kept as is, the error happens at runtime.
+    """
+
+    def __init__(self):
+        self.evaluator = Interpreter()
+
+    def optimize(self, tree):
+        return self.visit(tree)
+
+    def fold(self, node):
+        try:
+            return constant_node(node.token, self.evaluator.visit(node)) or node
+        except (RuntimeException, ArithmeticError):
+            return node
+
+    def visit_BinaryOpNode(self, node):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        if node.token.type in (AND, OR) and isinstance(node.left, BooleanNode):
+            # `false and ...`, `true or ...`: the right operand is never computed
+            if node.left.value == (node.token.type == OR):
+                return node.left
+        if isinstance(node.left, CONSTANT_NODES) and isinstance(node.right, CONSTANT_NODES):
+            return self.fold(node)
+        return node
+
+    def visit_ComparisonNode(self, node):
+        node.operands = [self.visit(operand) for operand in node.operands]
+        if all(isinstance(operand, CONSTANT_NODES) for operand in node.operands):
+            return self.fold(node)
+        return node
+
+    def visit_UnaryOpNode(self, node):
+        node.value = self.visit(node.value)
+        if isinstance(node.value, CONSTANT_NODES):
+            return self.fold(node)
+        return node
+
+    def visit_ArrayNode(self, node):
+        node.elements = [self.visit(element) for element in node.elements]
+        return node
+
+    def visit_IndexNode(self, node):
+        node.value = self.visit(node.value)
+        node.index = self.visit(node.index)
+        return node
+
+    def visit_NilNode(self, node):
+        return node
+
+    def visit_NumNode(self, node):
+        return node
+
+    def visit_BooleanNode(self, node):
+        return node
+
+    def visit_StringNode(self, node):
+        return node
+
+    def visit_VariableNode(self, node):
+        return node
+
+    def visit_WildcardNode(self, node):
+        return node
+
+    def visit_MatchNode(self, node):
+        node.factor = self.visit(node.factor)
+        node.matches = [[self.visit(pattern), self.visit(expression)] for pattern, expression in node.matches]
+        return node
+
+    def visit_FunctionCallNode(self, node):
+        node.arguments = [self.visit(argument) for argument in node.arguments]
+        return node
+
+    def visit_IfThenElseNode(self, node):
+        conditions = []
+        truthy_statements = []
+        always = False
+        for condition, statements in zip(node.conditions, node.truthy_statements):
+            condition = self.visit(condition)
+            never = always or (isinstance(condition, CONSTANT_NODES) and not condition.value)
+            if never and not declares(statements):
+                continue
+            conditions.append(condition)
+            truthy_statements.append(self.visit(statements))
+            if not never and isinstance(condition, CONSTANT_NODES):
+                # The branches after this one never run
+                always = True
+        node.conditions = conditions
+        node.truthy_statements = truthy_statements
+        if always and not (node.else_statements and declares(node.else_statements)):
+            node.else_statements = []
+        elif node.else_statements:
+            node.else_statements = self.visit(node.else_statements)
+
+        if not node.conditions and not node.else_statements:
+            return None
+        return node
+
+    def visit_WhileNode(self, node):
+        node.condition = self.visit(node.condition)
+        if isinstance(node.condition, CONSTANT_NODES) and not node.condition.value and not declares(node.statements):
+            return None
+        node.statements = self.visit(node.statements)
+        return node
+
+    def visit_ForNode(self, node):
+        node.start = self.visit(node.start)
+        node.end = self.visit(node.end)
+        node.statements = self.visit(node.statements)
+        return node
+
+    def visit_DeclarationNode(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    def visit_AssignmentNode(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    def visit_ReturnNode(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    def visit_FunctionNode(self, node):
+        if node.statements is not None:
+            node.statements = self.visit(node.statements)
+        return node
+
+    def visit_StatementListNode(self, node):
+        statements = []
+        returned = False
+        for statement in node.statements:
+            # After a return, only declarations are kept
+            if returned and not declares(statement):
+                continue
+            statement = self.visit(statement)
+            # A literal on its own line doesn't do anything
+            if statement is None or isinstance(statement, CONSTANT_NODES):
+                continue
+            statements.append(statement)
+            if statement.token.type == RETURN:
+                returned = True
+        node.statements = statements
+        return node
@@ -0,0 +1,64 @@
+import sys
+
+import rich
+
+
+# Characters kept before writing them out
+BUFFER_SIZE = 64 * 1024
+
+
+class Output:
+    """Where Huil's `print` writes, one line per value. Interpreters flush it when a program ends (even on an
+    error), and before `input` shows its prompt."""
+
+    def write(self, value):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+
+class StreamOutput(Output):
+    """Plain text written to `stream` (stdout by default) by chunks of about `buffer_size` characters, 0 writing
+    and flushing each line right away. Used for files, where printing a line per iteration is common."""
+
+    def __init__(self, stream=None, buffer_size=BUFFER_SIZE):
+        self.stream = sys.stdout if stream is None else stream
+        self.buffer_size = buffer_size
+        self.lines = []
+        self.size = 0
+
+    def write(self, value):
+        line = str(value)
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if self.size > self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.lines.append("")
+            self.stream.write("\n".join(self.lines))
+            self.lines = []
+            self.size = 0
+        self.stream.flush()
+
+
+class RichOutput(Output):
+    """Each value printed right away by `rich`, with its markup and highlighting. Used by the REPL."""
+
+    def write(self, value):
+        rich.print(value)
+
+
+class CaptureOutput(Output):
+    """Lines kept in memory, for programs run from Python."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, value):
+        self.lines.append(str(value))
+
+    def getvalue(self):
+        return "".join(line + "\n" for line in self.lines)
@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+
+# Processes running the calls of pmap/preduce, 1 runs them in the calling process
+WORKERS = os.cpu_count() or 1
+
+# Chunks per worker, so a worker getting slow calls doesn't keep the others waiting
+CHUNKS_PER_WORKER = 4
+
+# What the workers run: (interpreter, closure, reducing). Set before they are forked, they inherit it with the
+# interpreter's variables
+_task = None
+
+
+def can_fork():
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def start_worker(share):
+    """In a worker, before its first chunk: the budget of the interpreter is cut down to its share."""
+    budget = _task[0].budget
+    if budget is not None:
+        budget.take(*share)
+
+
+def run_chunk(values):
+    """In a worker: call the function on each value of the chunk, or reduce the chunk with it. Return the
+    result with the steps it took."""
+    interpreter, closure, reducing = _task
+    budget = interpreter.budget
+    steps = 0 if budget is None else budget.steps
+    if not reducing:
+        result = [interpreter.call(closure, [value]) for value in values]
+    else:
+        result = values[0]
+        for value in values[1:]:
+            result = interpreter.call(closure, [result, value])
+    return result, (0 if budget is None else budget.steps - steps)
+
+
+def run_parallel(interpreter, closure, values, reducing=False):
+    """Call a pure Huil function on chunks of `values` in worker processes, each with a copy of the interpreter.
+    Return the results in order (or the reduction of each chunk), None when it can't run in parallel here.
+
+    Workers are forked: the function, the functions it calls and the variables holding them are already in
+    their memory, only the values and the results go through pipes. Pure functions (see PurityAnalyzer) don't
+    print, read input or assign variables outside of them, so running them elsewhere changes nothing.
+
+    With a budget, each worker gets an even share of the steps and memory left, and the parent counts the steps
+    the workers took as its own.
+    """
+    workers = min(WORKERS, len(values))
+    # Batch workers (main.py --jobs) are daemons, which can't have processes of their own
+    if workers < 2 or not can_fork() or multiprocessing.current_process().daemon:
+        return None
+    global _task
+    size = -(-len(values) // (workers * CHUNKS_PER_WORKER))
+    chunks = [values[start : start + size] for start in range(0, len(values), size)]
+    # Printed before the call, printed before what comes after it
+    interpreter.output.flush()
+    _task = (interpreter, closure, reducing)
+    budget = interpreter.budget
+    share = None if budget is None else budget.split(workers)
+    # The workers stop at the deadline on their own, the parent doesn't wait for them any longer either
+    timeout = None if budget is None else budget.remaining()
+    try:
+        with multiprocessing.get_context("fork").Pool(workers, start_worker, (share,)) as pool:
+            try:
+                chunks = pool.map_async(run_chunk, chunks).get(timeout)
+            except multiprocessing.TimeoutError:
+                budget.exceeded("Time")
+    finally:
+        _task = None
+    results = [result for result, _ in chunks]
+    if budget is not None:
+        budget.steps += sum(steps for _, steps in chunks)
+        budget.check()
+    if reducing:
+        return results
+    return [result for chunk in results for result in chunk]
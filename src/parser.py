@@ -3,9 +3,44 @@ from src.ast import *
 from rich import print
 
 
+LITERALS = {
+    INTEGER: NumNode,
+    FLOAT: NumNode,
+    BOOLEAN: BooleanNode,
+    STRING: StringNode,
+}
+
+UNARY_OPERATORS = (PLUS, MINUS, NOT)
+
+# How tightly each binary operator holds its operands, `1 + 2 * 3` is `1 + (2 * 3)`. `and` and `or` have the
+# same power, `a or b and c` is `(a or b) and c`.
+BINDING_POWERS = {
+    AND: 10,
+    OR: 10,
+    SUPEQUAL: 20,
+    INFEQUAL: 20,
+    SUP: 20,
+    INF: 20,
+    EQUAL: 20,
+    NOTEQUAL: 20,
+    PLUS: 30,
+    MINUS: 30,
+    MUL: 40,
+    DIV: 40,
+    INTDIV: 40,
+    MOD: 40,
+}
+UNARY_POWER = 50
+
+COMPOUND_STATEMENTS = (IF, WHILE, FOR, FN)
+
+
 class Parser:
-    def __init__(self, lexer):
+    def __init__(self, lexer, lazy=False):
+        """With `lazy`, function bodies are only skimmed: their extent is found and their source is kept on the
+        FunctionNode, to be parsed when the function is first called. The lexer must be a Scanner."""
         self.lexer = lexer
+        self.lazy = lazy
         self.current_token = self.lexer.get_next_token()
 
     def error(self, token_type, error_message=None):
@@ -25,108 +60,122 @@ class Parser:
 
     def atom(self):
         token: Token = self.current_token
-        if token.type == INTEGER:
-            self.eat(INTEGER)
-            return NumNode(token, int(token.value))
-        elif token.type == FLOAT:
-            self.eat(FLOAT)
-            return NumNode(token, float(token.value))
-        elif token.type == BOOLEAN:
-            self.eat(BOOLEAN)
-            return BooleanNode(token, token.value)
-        elif token.type == STRING:
-            self.eat(STRING)
-            return StringNode(token, token.value)
+        if token.type in LITERALS:
+            self.current_token = self.lexer.get_next_token()
+            return LITERALS[token.type](token, token.value)
         elif token.type == LPAREN:
             self.eat(LPAREN)
             node = self.expression()
             self.eat(RPAREN)
             return node
         elif token.type == ID:
-            id_token = self.current_token
-            self.eat(ID)
-            return VariableNode(id_token, id=id_token.value)
+            self.current_token = self.lexer.get_next_token()
+            return VariableNode(token, id=token.value)
 
         # self.error(token.type)
 
     def primary(self):
         id_token: Token = self.current_token
         node = self.atom()
-        token: Token = self.current_token
-        if token.type == LPAREN:
-            self.eat(LPAREN)
-            args = []
-            if self.current_token.type != RPAREN:
-                while True:
-                    args.append(self.expression())
-                    if self.current_token.type == RPAREN:
-                        self.eat(RPAREN)
-                        break
-                    else:
-                        self.eat(COMMA)
-            else:
-                self.eat(RPAREN)
-            return FunctionCallNode(id_token, id_token.value, args)
+        if self.current_token.type == LPAREN:
+            return self.call(id_token)
         return node
 
-    def factor(self):
+    def call(self, id_token):
+        self.eat(LPAREN)
+        args = []
+        if self.current_token.type != RPAREN:
+            while True:
+                args.append(self.expression())
+                if self.current_token.type == RPAREN:
+                    self.eat(RPAREN)
+                    break
+                else:
+                    self.eat(COMMA)
+        else:
+            self.eat(RPAREN)
+        return FunctionCallNode(id_token, id_token.value, args)
+
+    def expression(self, min_power=0):
+        """Pratt parser: operators binding tighter than `min_power` are parsed here, in a loop, the others are
+        left to the callers. Literals and variables are parsed without any other call."""
         token = self.current_token
-        if token.type == PLUS:
-            self.eat(PLUS)
-            return UnaryOpNode(token, self.factor())
-        elif token.type == MINUS:
-            self.eat(MINUS)
-            return UnaryOpNode(token, self.factor())
-        elif token.type == NOT:
-            self.eat(NOT)
-            return UnaryOpNode(token, self.factor())
-        return self.primary()
-
-    def term(self):
-        node = self.factor()
-        while self.current_token.type in (MUL, DIV, INTDIV, MOD):
-            token = self.current_token
-            if token.type == MUL:
-                self.eat(MUL)
-            elif token.type == DIV:
-                self.eat(DIV)
-            elif token.type == INTDIV:
-                self.eat(INTDIV)
-            elif token.type == MOD:
-                self.eat(MOD)
+        if token.type in LITERALS:
+            self.current_token = self.lexer.get_next_token()
+            node = LITERALS[token.type](token, token.value)
+        elif token.type == ID:
+            self.current_token = self.lexer.get_next_token()
+            if self.current_token.type == LPAREN:
+                node = self.call(token)
+            else:
+                node = VariableNode(token, id=token.value)
+        elif token.type in UNARY_OPERATORS:
+            self.current_token = self.lexer.get_next_token()
+            node = UnaryOpNode(token, self.expression(UNARY_POWER))
+        elif token.type == MATCH:
+            node = self.match_expr()
+        elif token.type == LBRACKET:
+            node = self.array()
+        else:
+            node = self.primary()
 
-            node = BinaryOpNode(left=node, token=token, right=self.factor())
+        while self.current_token.type == LBRACKET:
+            token = self.current_token
+            self.eat(LBRACKET)
+            node = IndexNode(token, node, self.expression())
+            self.eat(RBRACKET)
 
-        return node
+        while True:
+            token = self.current_token
+            power = BINDING_POWERS.get(token.type)
+            if power is None or power <= min_power:
+                return node
+            self.current_token = self.lexer.get_next_token()
+            right = self.expression(power)
+            if token.type not in COMPARISONS or self.current_token.type not in COMPARISONS:
+                node = BinaryOpNode(left=node, token=token, right=right)
+                continue
 
-    def expression(self):
-        node = self.term()
+            # Chained comparison, `1 <= x < 6` is `1 <= x and x < 6` with x computed once
+            operands = [node, right]
+            operators = [token.type]
+            while self.current_token.type in COMPARISONS:
+                operators.append(self.current_token.type)
+                self.current_token = self.lexer.get_next_token()
+                operands.append(self.expression(power))
+            node = ComparisonNode(token, operands, operators)
 
-        while self.current_token.type in (PLUS, MINUS, AND, OR, SUPEQUAL, INFEQUAL, SUP, INF, EQUAL, NOTEQUAL):
-            token = self.current_token
-            if token.type == PLUS:
-                self.eat(PLUS)
-            elif token.type == MINUS:
-                self.eat(MINUS)
-            elif token.type == SUPEQUAL:
-                self.eat(SUPEQUAL)
-            elif token.type == INFEQUAL:
-                self.eat(INFEQUAL)
-            elif token.type == SUP:
-                self.eat(SUP)
-            elif token.type == INF:
-                self.eat(INF)
-            elif token.type == EQUAL:
-                self.eat(EQUAL)
-            elif token.type == NOTEQUAL:
-                self.eat(NOTEQUAL)
-            elif token.type == AND:
-                self.eat(AND)
-            elif token.type == OR:
-                self.eat(OR)
-            node = BinaryOpNode(left=node, token=token, right=self.term())
+    def array(self):
+        token = self.current_token
+        self.eat(LBRACKET)
+        elements = []
+        while self.current_token.type != RBRACKET:
+            elements.append(self.expression())
+            if self.current_token.type != RBRACKET:
+                self.eat(COMMA)
+        self.eat(RBRACKET)
+        return ArrayNode(token, elements)
 
-        return node
+    def match_expr(self):
+        token = self.current_token
+        self.eat(MATCH)
+        factor = self.expression()
+        self.eat(COLON)
+        matches = []
+        # One arm per line, the line return after the last one ends the statement the match is in
+        while self.current_token.type == NEWLINE and self.lexer.peek_token().type == PIPE:
+            self.eat(NEWLINE)
+            self.eat(PIPE)
+            if self.current_token.type == MUL:
+                pattern = WildcardNode(self.current_token)
+                self.eat(MUL)
+            else:
+                pattern = self.expression()
+            self.eat(ARROW)
+            matches.append([pattern, self.expression()])
+        if not matches:
+            self.error(self.current_token.type, "Expected match arms")
+        return MatchNode(token, factor, matches)
 
     def assignment(self):
         id_token = self.current_token
@@ -136,6 +185,8 @@ class Parser:
         # FRANCHEMENT, je saurais pas l'expliquer pour l'instant, je sais même pas si c'est correct
         expr = self.expression()
         if self.current_token.type == ASSIGN:
+            if type(expr) is IndexNode:
+                self.error(ASSIGN, "Arrays are values, their elements can't be assigned")
             self.eat(ASSIGN)
             return AssignmentNode(token=id_token, id=id_token.value, value=self.expression())
 
@@ -168,9 +219,70 @@ class Parser:
             else:
                 self.eat(COMMA)
         self.eat(COLON)
+        if self.lazy:
+            line = self.current_token.line
+            end = self.lexer.mark()
+            self.eat(NEWLINE)
+            end = self.skim_block(end)
+            source = self.lexer.cut(end)
+            return FunctionNode(fn_token, id=id_token.value, arguments=args, statements=None, source=source, line=line)
         self.eat(NEWLINE)
         return FunctionNode(fn_token, id=id_token.value, arguments=args, statements=self.statements(block=True))
 
+    # Skimming goes over the tokens of a block the way `statements(block=True)` does, so it ends on the same
+    # token, but only checks the parentheses and the `:` of compound statements. They return where the last line
+    # return they went over ends (`end` if there's none, for an empty block).
+
+    def skim_block(self, end):
+        indent = self.current_token.column
+        while self.current_token.type != EOF and self.current_token.column == indent:
+            if self.current_token.type in COMPOUND_STATEMENTS:
+                end = self.skim_compound(end)
+            else:
+                end = self.skim_line()
+        return end
+
+    def skim_compound(self, end):
+        keyword = self.current_token.type
+        end = self.skim_block(self.skim_line(header=True))
+        if keyword == IF:
+            while self.current_token.type == ELIF:
+                end = self.skim_block(self.skim_line(header=True))
+            if self.current_token.type == ELSE:
+                end = self.skim_block(self.skim_line(header=True))
+        return end
+
+    def skim_line(self, header=False):
+        depth = 0
+        # A match goes on with the lines starting with `|` which follow
+        arms = False
+        while True:
+            token_type = self.current_token.type
+            if token_type == NEWLINE:
+                if header or depth:
+                    self.error(token_type)
+                # Before looking at the next line
+                end = self.lexer.pos
+                if not arms or self.lexer.peek_token().type != PIPE:
+                    break
+            elif token_type == EOF:
+                self.error(token_type, "Expected newline")
+            elif header and depth == 0 and token_type == COLON:
+                self.eat(COLON)
+                end = self.lexer.pos
+                break
+            elif token_type == LPAREN:
+                depth += 1
+            elif token_type == RPAREN:
+                depth -= 1
+                if depth < 0:
+                    self.error(token_type)
+            elif token_type == MATCH:
+                arms = True
+            self.current_token = self.lexer.get_next_token()
+        self.eat(NEWLINE, "Expected newline")
+        return end
+
     def if_stmt(self):
         token = self.current_token
         self.eat(IF)
@@ -228,6 +340,31 @@ class Parser:
             return self.return_stmt()
         return self.expression()
 
+    def for_stmt(self):
+        token = self.current_token
+        self.eat(FOR)
+        name = self.current_token.value
+        self.eat(ID)
+        self.eat(IN)
+        if self.current_token.type == RANGE:
+            # `..end` counts from 0
+            start = NumNode(self.current_token, 0)
+        else:
+            start = self.expression()
+        self.eat(RANGE)
+        end = self.expression()
+        self.eat(COLON)
+        self.eat(NEWLINE)
+        statements = self.statements(block=True)
+
+        return ForNode(
+            token,
+            name,
+            start,
+            end,
+            statements,
+        )
+
     def compound_stmt(self):
         if self.current_token.type == IF:
             return self.if_stmt()
@@ -235,6 +372,8 @@ class Parser:
             return self.function_def()
         if self.current_token.type == WHILE:
             return self.while_stmt()
+        if self.current_token.type == FOR:
+            return self.for_stmt()
 
     def simple_stmts(self):
         stmt = self.simple_stmt()
@@ -253,11 +392,12 @@ class Parser:
                 continue
 
             cmp = self.compound_stmt()
-            sim = self.simple_stmts()
-
             if cmp:
                 nodes.append(cmp)
+                # The next statement may not belong to this block anymore
+                continue
 
+            sim = self.simple_stmts()
             if sim:
                 nodes.append(sim)
 
@@ -0,0 +1,239 @@
+import time
+from collections import Counter
+
+from src.ast import FunctionNode, iter_child_nodes
+from src.interpreter import Interpreter
+from src.numarray import NumArray
+from src.rope import Rope
+
+
+MAIN = "<main>"
+
+
+class Frame:
+    """A function (its name and stack) or a statement (its line) being run: when it started, and the time spent
+    in the ones it ran."""
+
+    __slots__ = ("key", "name", "start", "children")
+
+    def __init__(self, key, start, name=None):
+        self.key = key
+        self.name = name
+        self.start = start
+        self.children = 0.0
+
+
+class FunctionStats:
+    __slots__ = ("calls", "inclusive", "exclusive", "allocations")
+
+    def __init__(self):
+        self.calls = 0
+        # With the functions it called, counted once for recursive calls
+        self.inclusive = 0.0
+        # Without them
+        self.exclusive = 0.0
+        self.allocations = 0
+
+
+class Profiler:
+    """Wall time of a Huil program by function and by source line.
+
+    Functions are timed with (inclusive) and without (exclusive) the functions they call, and the time of a
+    line leaves out the lines it runs in turn (the body of a loop, or of a called function). Stacks of
+    functions and their exclusive time are kept for flame graphs (see `write_stacks`). Variable lookups are
+    counted by how many scopes they go up, and values created by the program (scopes, closures, arrays and
+    strings made by operators) by the function creating them.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.functions = {MAIN: FunctionStats()}
+        # Line: [statements run, exclusive time]
+        self.lines = {}
+        # "main;f;g": exclusive time of g when called by f, called by the main program
+        self.stacks = Counter()
+        self.depths = Counter()
+        self.allocations = Counter()
+        self.start = clock()
+        self.elapsed = None
+        self.calls = [Frame(MAIN, self.start, MAIN)]
+        self.statements = []
+        # Calls of each function which haven't returned, for recursive functions
+        self.active = Counter()
+
+    def enter(self, name):
+        stats = self.functions.get(name)
+        if stats is None:
+            stats = self.functions[name] = FunctionStats()
+        stats.calls += 1
+        self.active[name] += 1
+        self.calls.append(Frame(f"{self.calls[-1].key};{name}", self.clock(), name))
+
+    def leave(self):
+        frame = self.calls.pop()
+        elapsed = self.clock() - frame.start
+        self.calls[-1].children += elapsed
+        name = frame.name
+        stats = self.functions[name]
+        stats.exclusive += elapsed - frame.children
+        self.stacks[frame.key] += elapsed - frame.children
+        self.active[name] -= 1
+        if not self.active[name]:
+            stats.inclusive += elapsed
+
+    def enter_line(self, line):
+        self.statements.append(Frame(line, self.clock()))
+
+    def leave_line(self):
+        frame = self.statements.pop()
+        elapsed = self.clock() - frame.start
+        if self.statements:
+            self.statements[-1].children += elapsed
+        counts = self.lines.get(frame.key)
+        if counts is None:
+            counts = self.lines[frame.key] = [0, 0.0]
+        counts[0] += 1
+        counts[1] += elapsed - frame.children
+
+    def allocate(self, kind):
+        self.allocations[kind] += 1
+        self.functions[self.calls[-1].name].allocations += 1
+
+    def stop(self):
+        """End of the program, whether it finished or failed."""
+        while len(self.calls) > 1:
+            self.leave()
+        while self.statements:
+            self.leave_line()
+        main = self.calls[0]
+        self.elapsed = self.clock() - main.start
+        stats = self.functions[MAIN]
+        stats.calls = 1
+        stats.inclusive = self.elapsed
+        stats.exclusive = self.elapsed - main.children
+        self.stacks[MAIN] += stats.exclusive
+
+    def report(self, source=None, limit=20):
+        """Text report, functions and lines sorted by exclusive time. `source` is the program, to show lines."""
+        source_lines = source.splitlines() if source is not None else []
+        total = self.elapsed or 1e-9
+        lines = [f"Profile: {self.elapsed:.3f}s", ""]
+        lines.append(f"{'function':<24} {'calls':>9} {'inclusive':>19} {'exclusive':>19} {'allocations':>12}")
+        for name, stats in sorted(self.functions.items(), key=lambda item: -item[1].exclusive)[:limit]:
+            lines.append(
+                f"{name:<24} {stats.calls:>9} {stats.inclusive:>10.3f}s {stats.inclusive / total:>6.1%} "
+                f"{stats.exclusive:>10.3f}s {stats.exclusive / total:>6.1%} {stats.allocations:>12}"
+            )
+
+        lines += ["", f"{'line':>6} {'runs':>11} {'time':>19}"]
+        for line, (runs, elapsed) in sorted(self.lines.items(), key=lambda item: -item[1][1])[:limit]:
+            text = source_lines[line].strip() if line < len(source_lines) else ""
+            lines.append(f"{line + 1:>6} {runs:>11} {elapsed:>10.3f}s {elapsed / total:>6.1%}  {text}")
+
+        lookups = sum(self.depths.values())
+        lines += ["", f"Variable lookups: {lookups}"]
+        for depth, count in sorted(self.depths.items()):
+            lines.append(f"    {depth} scope{'' if depth == 1 else 's'} up: {count} ({count / lookups:.1%})")
+
+        allocations = ", ".join(f"{kind} {count}" for kind, count in sorted(self.allocations.items()))
+        lines += ["", f"Allocations: {allocations or 'none'}"]
+        return "\n".join(lines)
+
+    def write_stacks(self, path):
+        """Collapsed stacks, `main;f;g 1234` with the exclusive time in microseconds, as read by flamegraph.pl,
+        speedscope or inferno."""
+        with open(path, "w") as f:
+            for stack, elapsed in sorted(self.stacks.items()):
+                microseconds = round(elapsed * 1e6)
+                if microseconds:
+                    f.write(f"{stack} {microseconds}\n")
+
+
+class ProfilingInterpreter(Interpreter):
+    """Interpreter reporting what it runs to a Profiler. It is only used when profiling, so the Interpreter
+    itself pays nothing for it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profiler = Profiler()
+        # Functions, by the id of their body
+        self.bodies = {}
+
+    def find_functions(self, node):
+        if type(node) is FunctionNode and node.statements is not None:
+            self.bodies[id(node.statements)] = node
+        for child in iter_child_nodes(node):
+            self.find_functions(child)
+
+    def prepare(self, tree):
+        super().prepare(tree)
+        self.find_functions(tree)
+
+    def run(self, tree):
+        self.profiler = Profiler()
+        try:
+            super().run(tree)
+        finally:
+            self.profiler.stop()
+
+    def load(self, function):
+        super().load(function)
+        self.find_functions(function)
+
+    def visit_StatementListNode(self, node):
+        function = self.bodies.get(id(node))
+        if function is None:
+            return self.run_statements(node)
+        self.profiler.enter(function.id)
+        # Each call runs its body in a new scope
+        self.profiler.allocate("scopes")
+        try:
+            return self.run_statements(node)
+        finally:
+            self.profiler.leave()
+
+    def run_statements(self, node):
+        profiler = self.profiler
+        for statement in node.statements:
+            profiler.enter_line(statement.token.line)
+            try:
+                returned = self.visit(statement)
+            finally:
+                profiler.leave_line()
+            if self.returning:
+                return returned
+
+    def visit_VariableNode(self, node):
+        self.profiler.depths[node.depth] += 1
+        return super().visit_VariableNode(node)
+
+    def visit_AssignmentNode(self, node):
+        self.profiler.depths[node.depth] += 1
+        return super().visit_AssignmentNode(node)
+
+    def visit_FunctionCallNode(self, node):
+        if node.native is None:
+            self.profiler.depths[node.depth] += 1
+        return super().visit_FunctionCallNode(node)
+
+    def visit_FunctionNode(self, node):
+        self.profiler.allocate("closures")
+        return super().visit_FunctionNode(node)
+
+    def visit_ArrayNode(self, node):
+        self.profiler.allocate("arrays")
+        return super().visit_ArrayNode(node)
+
+    def visit_BinaryOpNode(self, node):
+        value = super().visit_BinaryOpNode(node)
+        if type(value) is NumArray:
+            self.profiler.allocate("arrays")
+        elif type(value) is Rope:
+            self.profiler.allocate("strings")
+        return value
+
+    def visit_UnaryOpNode(self, node):
+        value = super().visit_UnaryOpNode(node)
+        if type(value) is NumArray:
+            self.profiler.allocate("arrays")
+        return value
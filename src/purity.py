@@ -0,0 +1,177 @@
+from src.ast import iter_child_nodes
+from src.visitor import NodeVisitor
+
+
+class Scope:
+    def __init__(self):
+        # Slot -> FunctionNode declared in it
+        self.functions = {}
+        # Slots assigned somewhere, the function they hold (if any) can't be relied on
+        self.assigned = set()
+        # Slot -> functions found pure which call (or read) the function it holds
+        self.dependents = {}
+
+    def function(self, slot):
+        if slot in self.assigned:
+            return None
+        return self.functions.get(slot)
+
+
+class PurityAnalyzer(NodeVisitor):
+    """Finds the functions whose result only depends on their arguments, which can be memoized.
+
+    A function is pure when it:
+    - doesn't call print, input, or any other builtin which isn't registered as pure
+    - doesn't assign variables of the enclosing scopes
+    - doesn't read variables of the enclosing scopes, except the ones holding functions
+    - only calls pure functions, known by name (calling an argument makes it impure)
+
+    Functions which haven't been parsed yet (lazy Parser) are impure.
+
+    Runs on resolved trees, FunctionNode.pure is set accordingly and the pure functions are returned.
+
+    Global functions stay known from one program (REPL line) to the next. When a later program assigns a
+    global which held a function, the functions found pure which relied on it, and the ones calling them, are
+    made impure again (their results could change).
+    """
+
+    def __init__(self):
+        self.global_scope = Scope()
+        # id of a function -> functions calling it, from every program analyzed
+        self.callers = {}
+
+    def analyze(self, tree, natives):
+        """`natives` are the global slots holding builtins, as listed by the Resolver."""
+        self.natives = natives
+        self.scopes = {}
+        # First pass: which slot holds which function, and which slots get reassigned
+        self.collecting = True
+        self.stack = [self.global_scope]
+        assigned = set(self.global_scope.assigned)
+        self.visit(tree)
+        for slot in self.global_scope.assigned - assigned:
+            for function in self.global_scope.dependents.pop(slot, []):
+                self.invalidate(function)
+
+        # Second pass: what each function does, and which functions it calls
+        self.collecting = False
+        self.stack = [self.global_scope]
+        self.current = None
+        self.impure = set()
+        self.callees = {}
+        self.functions = {}
+        self.visit(tree)
+
+        # A function calling an impure function is impure, until nothing changes
+        changed = True
+        while changed:
+            changed = False
+            for key, callees in self.callees.items():
+                if key not in self.impure and any(self.is_impure(callee) for callee in callees):
+                    self.impure.add(key)
+                    changed = True
+
+        for key, function in self.functions.items():
+            function.pure = key not in self.impure
+            for callee in self.callees[key]:
+                self.callers.setdefault(id(callee), []).append(function)
+        return [function for function in self.functions.values() if function.pure]
+
+    def invalidate(self, function):
+        """`function`, analyzed with a previous program, relies on a global which got assigned."""
+        if not function.pure:
+            return
+        function.pure = False
+        for caller in self.callers.get(id(function), []):
+            self.invalidate(caller)
+
+    def unhandled_visit(self, node):
+        for child in iter_child_nodes(node):
+            self.visit(child)
+
+    def scope(self, depth):
+        return self.stack[-1 - depth]
+
+    def taint(self):
+        if self.current is not None:
+            self.impure.add(id(self.current))
+
+    def visit_FunctionNode(self, node):
+        if node.statements is None:
+            # Not parsed yet (lazy Parser), nothing is known about it
+            if self.collecting:
+                self.stack[-1].functions[node.slot] = node
+            else:
+                self.functions[id(node)] = node
+                self.callees[id(node)] = []
+                self.impure.add(id(node))
+            return
+
+        if self.collecting:
+            self.stack[-1].functions[node.slot] = node
+            self.scopes[id(node)] = Scope()
+            self.stack.append(self.scopes[id(node)])
+            self.visit(node.statements)
+            self.stack.pop()
+            return
+
+        enclosing = self.current
+        self.current = node
+        self.functions[id(node)] = node
+        self.callees[id(node)] = []
+        self.stack.append(self.scopes[id(node)])
+        self.visit(node.statements)
+        self.stack.pop()
+        self.current = enclosing
+
+    def visit_ForNode(self, node):
+        self.visit(node.start)
+        self.visit(node.end)
+        if self.collecting:
+            self.stack[-1].assigned.add(node.slot)
+        self.visit(node.statements)
+
+    def visit_AssignmentNode(self, node):
+        self.visit(node.value)
+        if self.collecting:
+            self.scope(node.depth).assigned.add(node.slot)
+        elif node.depth > 0:
+            self.taint()
+
+    def visit_VariableNode(self, node):
+        if self.collecting or self.current is None or node.depth == 0:
+            return
+        scope = self.scope(node.depth)
+        if scope.function(node.slot) is not None:
+            self.depend(scope, node.slot)
+        elif not (scope is self.global_scope and node.slot in self.natives):
+            self.taint()
+
+    def visit_FunctionCallNode(self, node):
+        for argument in node.arguments:
+            self.visit(argument)
+        if self.collecting or self.current is None:
+            return
+
+        if node.native is not None:
+            if not node.native.pure:
+                self.taint()
+            return
+        scope = self.scope(node.depth)
+        callee = scope.function(node.slot)
+        if callee is None:
+            self.taint()
+        else:
+            self.callees[id(self.current)].append(callee)
+            self.depend(scope, node.slot)
+
+    def depend(self, scope, slot):
+        """The current function relies on the function held by `slot`, which later programs could assign."""
+        if scope is self.global_scope:
+            scope.dependents.setdefault(slot, []).append(self.current)
+
+    def is_impure(self, function):
+        if id(function) in self.functions:
+            return id(function) in self.impure
+        # Analyzed with a previous program
+        return not function.pure
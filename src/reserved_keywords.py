@@ -1,17 +1,20 @@
-from src.token import Token
+from src.tokens import *
 
 
+# Type and value of the token of each keyword, the lexers create a new Token every time
 RESERVED_KEYWORDS = {
-    "let": Token("LET", "LET", 0, 0),
-    "fn": Token("FN", "FN", 0, 0),
-    "match": Token("MATCH", "MATCH", 0, 0),
-    "true": Token("BOOLEAN", True, 0, 0),
-    "false": Token("BOOLEAN", False, 0, 0),
-    "and": Token("AND", "AND", 0, 0),
-    "or": Token("OR", "OR", 0, 0),
-    "if": Token("IF", "IF", 0, 0),
-    "elif": Token("ELIF", "ELIF", 0, 0),
-    "else": Token("ELSE", "ELSE", 0, 0),
-    "return": Token("RETURN", "RETURN", 0, 0),
-    "while": Token("WHILE", "WHILE", 0, 0),
+    "let": (LET, "LET"),
+    "fn": (FN, "FN"),
+    "match": (MATCH, "MATCH"),
+    "true": (BOOLEAN, True),
+    "false": (BOOLEAN, False),
+    "and": (AND, "AND"),
+    "or": (OR, "OR"),
+    "if": (IF, "IF"),
+    "elif": (ELIF, "ELIF"),
+    "else": (ELSE, "ELSE"),
+    "return": (RETURN, "RETURN"),
+    "while": (WHILE, "WHILE"),
+    "for": (FOR, "FOR"),
+    "in": (IN, "IN"),
 }
@@ -0,0 +1,219 @@
+from typing import Any, Dict, List, Set
+
+from src.builtins import BUILTINS
+from src.ast import FunctionCallNode
+from src.environment import NameErrorException
+from src.visitor import NodeVisitor
+
+
+class Resolver(NodeVisitor):
+    """Static pass computing the lexical address (depth, slot) of every variable.
+
+    A function call gets its own scope, which only sees its own variables, the ones of the functions it is
+    declared in, and the global ones. Blocks (if, while, for) don't create scopes.
+
+    Global variables are late bound: a function body can use a global declared further down the file, as
+    long as it is declared somewhere in the program. Until its declaration runs, the slot of a global holds
+    UNSET, and reading it raises the undeclared variable error. Everything else is checked here, once, rather
+    than at every access.
+
+    Builtins are looked up last. The ones a program uses get a global slot, listed in `natives` so the
+    interpreter can fill it.
+    """
+
+    def __init__(self):
+        self.globals: Dict[str, int] = {}
+        self.natives: Dict[int, Any] = {}
+        # Globals used by a function body but not declared (yet)
+        self.pending: Dict[str, int] = {}
+        self.global_count = len(self.globals)
+        # Scopes of the functions being resolved, innermost last
+        self.scopes: List[Dict[str, int]] = []
+        # Globals declared so far by the program being resolved outside of any block (if, while, for), and how
+        # many blocks the statements being resolved are in
+        self.bound: Set[str] = set()
+        self.blocks = 0
+
+    def resolve(self, tree):
+        self.scopes = []
+        self.blocks = 0
+        try:
+            self.visit(tree)
+            for name in self.pending:
+                raise NameErrorException(f"Undeclared variable: {name}")
+        finally:
+            self.pending = {}
+            self.bound = set()
+
+    def declare(self, name):
+        if self.scopes:
+            scope = self.scopes[-1]
+            if name in scope:
+                raise NameErrorException(f"Variable already declared: {name}")
+            scope[name] = len(scope)
+            return scope[name]
+
+        if name in self.globals:
+            raise NameErrorException(f"Variable already declared: {name}")
+        if name in self.pending:
+            self.globals[name] = self.pending.pop(name)
+        else:
+            self.globals[name] = self.global_count
+            self.global_count += 1
+        return self.globals[name]
+
+    def lookup(self, name):
+        """Return the (depth, slot) address of a variable."""
+        for depth, scope in enumerate(reversed(self.scopes)):
+            if name in scope:
+                return depth, scope[name]
+
+        depth = len(self.scopes)
+        if name in self.globals:
+            return depth, self.globals[name]
+        if name in BUILTINS:
+            self.globals[name] = self.global_count
+            self.natives[self.global_count] = BUILTINS[name]
+            self.global_count += 1
+            return depth, self.globals[name]
+        if not self.scopes:
+            raise NameErrorException(f"Undeclared variable: {name}")
+        if name not in self.pending:
+            self.pending[name] = self.global_count
+            self.global_count += 1
+        return depth, self.pending[name]
+
+    def visit_StatementListNode(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+
+    def visit_BinaryOpNode(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_ComparisonNode(self, node):
+        for operand in node.operands:
+            self.visit(operand)
+
+    def visit_ArrayNode(self, node):
+        for element in node.elements:
+            self.visit(element)
+
+    def visit_IndexNode(self, node):
+        self.visit(node.value)
+        self.visit(node.index)
+
+    def visit_UnaryOpNode(self, node):
+        self.visit(node.value)
+
+    def visit_NilNode(self, node):
+        pass
+
+    def visit_NumNode(self, node):
+        pass
+
+    def visit_BooleanNode(self, node):
+        pass
+
+    def visit_StringNode(self, node):
+        pass
+
+    def visit_VariableNode(self, node):
+        node.depth, node.slot = self.lookup(node.id)
+        node.bound = not self.scopes and node.id in self.bound
+
+    def visit_WildcardNode(self, node):
+        pass
+
+    def visit_MatchNode(self, node):
+        self.visit(node.factor)
+        for pattern, expression in node.matches:
+            self.visit(pattern)
+            self.visit(expression)
+
+    def visit_FunctionCallNode(self, node):
+        node.depth, node.slot = self.lookup(node.id)
+        if node.depth == len(self.scopes) and node.slot in self.natives:
+            node.native = self.natives[node.slot]
+        for argument in node.arguments:
+            self.visit(argument)
+
+    def block(self, statements):
+        self.blocks += 1
+        try:
+            self.visit(statements)
+        finally:
+            self.blocks -= 1
+
+    def visit_IfThenElseNode(self, node):
+        for condition, statements in zip(node.conditions, node.truthy_statements):
+            self.visit(condition)
+            self.block(statements)
+        if node.else_statements:
+            self.block(node.else_statements)
+
+    def visit_WhileNode(self, node):
+        self.visit(node.condition)
+        self.block(node.statements)
+
+    def visit_ForNode(self, node):
+        self.visit(node.start)
+        self.visit(node.end)
+        # Declared by the loop, unless an earlier one (or a let) already did
+        scope = self.scopes[-1] if self.scopes else self.globals
+        if node.id not in scope:
+            node.slot = self.declare(node.id)
+        elif not self.scopes and scope[node.id] in self.natives:
+            raise NameErrorException(f"Can't assign to builtin: {node.id}")
+        else:
+            node.slot = scope[node.id]
+        self.block(node.statements)
+
+    def visit_DeclarationNode(self, node):
+        self.visit(node.value)
+        node.slot = self.declare(node.id)
+        if not self.scopes and not self.blocks:
+            self.bound.add(node.id)
+
+    def visit_AssignmentNode(self, node):
+        self.visit(node.value)
+        node.depth, node.slot = self.lookup(node.id)
+        if node.depth == len(self.scopes) and node.slot in self.natives:
+            raise NameErrorException(f"Can't assign to builtin: {node.id}")
+
+    def visit_ReturnNode(self, node):
+        self.visit(node.value)
+        node.tail = bool(self.scopes) and type(node.value) is FunctionCallNode and node.value.native is None
+
+    def visit_FunctionNode(self, node):
+        # Declared before its body is resolved, so it can call itself
+        node.slot = self.declare(node.id)
+        if node.statements is None:
+            # Not parsed yet, the body will see the variables declared so far
+            node.scopes = [dict(scope) for scope in self.scopes]
+            return
+        self.body(node)
+
+    def body(self, node):
+        self.scopes.append({})
+        try:
+            for argument in node.arguments:
+                self.declare(argument)
+            self.visit(node.statements)
+            node.scope_size = len(self.scopes[-1])
+        finally:
+            self.scopes.pop()
+
+    def resolve_function(self, node):
+        """Resolve the body of a function parsed on its first call, in the scopes it is declared in. The
+        whole program has been resolved by then, a global which still isn't declared is an error."""
+        scopes = self.scopes
+        self.scopes = list(node.scopes)
+        try:
+            self.body(node)
+            for name in self.pending:
+                raise NameErrorException(f"Undeclared variable: {name}")
+        finally:
+            self.scopes = scopes
+            self.pending = {}
+        node.scopes = None
@@ -0,0 +1,97 @@
+from src.tokens import *
+
+
+class Rope:
+    """Huil string made by `+`: the strings it is made of, joined into a `str` only when it is needed (printed,
+    compared, matched or given to a builtin, see `flatten`).
+
+    The parts list is shared: `s + x` appends `x` to the list of `s` and returns a Rope seeing one more part, so
+    building a string in a loop copies each part once instead of copying the whole string at every step. Each
+    Rope only sees its first `count` parts, so strings already made don't change. When the list of `s` already
+    has parts after its own (another string was built from `s`), it is copied first. Prepending works the same
+    way: `x + s` appends `x` to the `heads` of `s`, the parts coming before the others, last one first.
+    """
+
+    __slots__ = ("parts", "count", "heads", "head_count", "length", "flat")
+
+    def __init__(self, parts, heads, length):
+        self.parts = parts
+        self.count = len(parts)
+        self.heads = heads
+        self.head_count = len(heads)
+        # Characters of the string
+        self.length = length
+        # The joined parts, once they are needed
+        self.flat = None
+
+    def flatten(self):
+        if self.flat is None:
+            parts = seen(self.parts, self.count)
+            if self.head_count:
+                parts = seen(self.heads, self.head_count)[::-1] + parts
+            self.flat = "".join(parts)
+        return self.flat
+
+    def __eq__(self, other):
+        return text(other) == self.flatten()
+
+    def __hash__(self):
+        return hash(self.flatten())
+
+    def __str__(self):
+        return self.flatten()
+
+    def __repr__(self):
+        return repr(self.flatten())
+
+
+def text(value):
+    """`value`, as a `str` if it is a Rope."""
+    return value.flatten() if type(value) is Rope else value
+
+
+def is_string(value):
+    return type(value) is str or type(value) is Rope
+
+
+def pending(value):
+    """Characters `flatten` would join to make `value` a `str`, for memory budgets."""
+    return value.length if type(value) is Rope and value.flat is None else 0
+
+
+def seen(parts, count):
+    """The first `count` of `parts`, the list itself when nothing comes after them."""
+    return parts if len(parts) == count else parts[:count]
+
+
+def extend(parts, count, value):
+    """The first `count` of `parts` followed by `value`: appended to the list when nothing came after them."""
+    parts = seen(parts, count)
+    parts.append(value)
+    return parts
+
+
+def concat(left, right):
+    if type(left) is Rope:
+        right = text(right)
+        return Rope(extend(left.parts, left.count, right), seen(left.heads, left.head_count), left.length + len(right))
+    if type(right) is Rope:
+        # `x + s` adds to the heads of `s` the way `s + x` adds to its parts
+        heads = extend(right.heads, right.head_count, left)
+        return Rope(seen(right.parts, right.count), heads, len(left) + right.length)
+    return Rope([left, right], [], len(left) + len(right))
+
+
+# Operators applied to strings, by token type
+STRING_OPERATIONS = {
+    PLUS: concat,
+    EQUAL: lambda left, right: text(left) == text(right),
+    NOTEQUAL: lambda left, right: text(left) != text(right),
+}
+
+# What they allocate, by token type (see Budget.guard): `+` only joins its right operand, when appending
+STRING_ALLOCATIONS = {
+    PLUS: lambda left, right: pending(right) if type(left) is Rope else 0,
+    EQUAL: lambda left, right: pending(left) + pending(right),
+    NOTEQUAL: lambda left, right: pending(left) + pending(right),
+}
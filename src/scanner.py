@@ -0,0 +1,253 @@
+import codecs
+import io
+import re
+from sys import intern
+
+from src.lexer import Lexer
+from src.reserved_keywords import RESERVED_KEYWORDS
+from src.token import *
+
+
+# Chars read at once from file sources
+CHUNK_SIZE = 64 * 1024
+
+OPERATORS = {
+    "+": PLUS,
+    "-": MINUS,
+    "*": MUL,
+    "%": MOD,
+    "/": DIV,
+    "(": LPAREN,
+    ")": RPAREN,
+    "[": LBRACKET,
+    "]": RBRACKET,
+    ">": SUP,
+    "<": INF,
+    "=": ASSIGN,
+    "!": NOT,
+    ":": COLON,
+    ",": COMMA,
+    "|": PIPE,
+    "->": ARROW,
+    ">=": SUPEQUAL,
+    "<=": INFEQUAL,
+    "==": EQUAL,
+    "!=": NOTEQUAL,
+    "..": RANGE,
+}
+
+# Each match is the whitespace and comments to skip, then a token: its kind is the index of the group that
+# matched. Lexemes starting with a non ASCII letter or digit fall in the last group and are handed to the Lexer
+# (`isalpha`/`isdigit` are hard to express as a regex), like invalid characters.
+NEWLINE_GROUP, ID_GROUP, NUMBER_GROUP, OPERATOR_GROUP, STRING_GROUP, OTHER_GROUP = range(1, 7)
+TOKEN_REGEX = re.compile(
+    r"""
+    (?:[^\S\n]\s* | //[^\n]*)*
+    (?:
+        (\n)
+        | ([A-Za-z_]\w*)
+        | ([0-9](?:[0-9]|\.(?!\.))*(?![0-9]|\.(?!\.)|[^\x00-\x7f]))
+        | (->|>=|<=|==|!=|\.\.|[-+*%/()\[\]><=!:,|])
+        | ("[^"]*"?)
+        | (.)
+    )?
+    """,
+    re.VERBOSE,
+)
+
+
+class Scanner:
+    """Drop-in replacement for the Lexer, matching a compiled regex instead of going char by char.
+
+    It returns exactly the same tokens, positions included. Some of them are a bit surprising but the
+    Parser and the error messages rely on them:
+    - operators and numbers are positioned on the column right after them, strings and ids on their first
+      column
+    - NEWLINE is positioned at the start of the next line
+    - whitespace which doesn't start with a line return swallows the following line returns, without
+      counting them (same thing for line returns inside strings)
+
+    The source is either a string, or something with a `read(size)` method (text or binary file, mmap)
+    which is read `chunk_size` chars at a time, as the tokens are asked for. Only the part of the source
+    which hasn't been tokenized yet is kept. Binary sources are decoded as UTF-8, with their line returns
+    translated like a file opened in text mode.
+
+    `line` is the line the source starts on, when it is a part of a file (a function body parsed lazily).
+    """
+
+    def __init__(self, source, chunk_size=CHUNK_SIZE, line=0):
+        if isinstance(source, str):
+            self.text = source
+            self.source = None
+        else:
+            self.text = ""
+            self.source = source
+            self.chunk_size = chunk_size
+            self.decoder = None
+        # Position in the whole source
+        self.pos = 0
+        self.line = line
+        self.column = 0
+        # Position of `text` in the whole source
+        self.base = 0
+        # Start of the part of the source kept for `cut`, even once tokenized
+        self.marked = None
+        self.tokens = self.scan()
+        # Saves a call per token
+        self.get_next_token = self.tokens.__next__
+
+    def get_next_token(self):
+        return next(self.tokens)
+
+    def peek_token(self):
+        """The next token, which get_next_token returns again. Until then, the position is the one after it."""
+        token = next(self.tokens)
+
+        def get_next_token():
+            self.get_next_token = self.tokens.__next__
+            return token
+
+        self.get_next_token = get_next_token
+        return token
+
+    def read(self):
+        """The next chunk of the source, an empty string once it has all been read."""
+        if self.source is None:
+            return ""
+        while True:
+            data = self.source.read(self.chunk_size)
+            if isinstance(data, str):
+                text = data
+            else:
+                if self.decoder is None:
+                    self.decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(), True)
+                text = self.decoder.decode(data, final=not data)
+            # A chunk can end in the middle of a character, which comes with the next one
+            if text or not data:
+                break
+        if not text:
+            self.source = None
+        return text
+
+    def scan(self):
+        text = self.text = self.text + self.read()
+        exhausted = self.source is None
+        base = 0
+        # The column is the distance from the start of the line, which moves on NEWLINE tokens only. Like the
+        # matches, it is relative to `text`.
+        line_start = 0
+        line = self.line
+        pos = 0
+        keywords = RESERVED_KEYWORDS
+        operators = OPERATORS
+        while True:
+            # Where to start again with more of the source, when a match reaches the end of `text`: the
+            # token may be longer than what was read so far
+            keep = None
+            for match in TOKEN_REGEX.finditer(text, pos):
+                kind = match.lastindex
+                end = match.end()
+                if end == len(text) and not exhausted:
+                    keep = match.start()
+                    break
+                if kind is None:
+                    # Nothing but whitespace until the end
+                    pos = end
+                    continue
+
+                if kind == ID_GROUP:
+                    lexeme = match.group(kind)
+                    keyword = keywords.get(lexeme)
+                    if keyword is None:
+                        # Names come back a lot, the tokens and nodes can all share the same string
+                        token = Token(ID, intern(lexeme), line, match.start(kind) - line_start)
+                    else:
+                        token = Token(keyword[0], keyword[1], line, match.start(kind) - line_start)
+                elif kind == OPERATOR_GROUP:
+                    lexeme = match.group(kind)
+                    token = Token(operators[lexeme], lexeme, line, end - line_start)
+                elif kind == NEWLINE_GROUP:
+                    line += 1
+                    line_start = end
+                    token = Token(NEWLINE, None, line, 0)
+                elif kind == NUMBER_GROUP:
+                    lexeme = match.group(kind)
+                    if "." in lexeme:
+                        token = Token(FLOAT, float(lexeme), line, end - line_start)
+                    else:
+                        token = Token(INTEGER, int(lexeme), line, end - line_start)
+                elif kind == STRING_GROUP:
+                    lexeme = match.group(kind)
+                    if len(lexeme) > 1 and lexeme[-1] == '"':
+                        token = Token(STRING, lexeme[1:-1], line, match.start(kind) - line_start)
+                    else:
+                        # Unterminated, the Lexer steps past the end of the text
+                        token = Token(STRING, lexeme[1:], line, match.start(kind) - line_start)
+                        self.pos, self.line, self.column = base + end + 1, line, end + 1 - line_start
+                        yield token
+                        pos = end + 1
+                        break
+                else:
+                    start = match.start(kind)
+                    # Whatever the Lexer makes of it, including the error for invalid characters
+                    token, end = self.fallback(text, start, line, start - line_start, exhausted)
+                    if token is None:
+                        keep = start
+                        break
+                    line = self.line
+                    line_start = end - self.column
+                    self.pos = base + end
+                    yield token
+                    pos = end
+                    break
+
+                self.pos, self.line, self.column = base + end, line, end - line_start
+                yield token
+            else:
+                self.pos, self.line, self.column = base + pos, line, pos - line_start
+                break
+
+            if keep is not None:
+                # Drop what has been tokenized (and isn't marked) and read some more
+                drop = keep if self.marked is None else min(keep, self.marked - base)
+                chunk = self.read()
+                exhausted = not chunk
+                text = text[drop:] + chunk
+                self.text = text
+                base += drop
+                self.base = base
+                line_start -= drop
+                pos = keep - drop
+            elif pos > len(text):
+                break
+
+        while True:
+            yield Token(EOF, None, self.line, self.column)
+
+    def mark(self):
+        """Keep the source from the end of the last token on, until `cut` is called."""
+        self.marked = self.pos
+        return self.pos
+
+    def cut(self, end):
+        """The source from the mark to `end` (a position in the whole source, after the mark)."""
+        start, self.marked = self.marked, None
+        return self.text[start - self.base : end - self.base]
+
+    def fallback(self, text, pos, line, column, exhausted):
+        """Token read by the Lexer at `pos` in `text`, and where it stopped. The token is None when the Lexer
+        reached the end of `text` while there's more to read."""
+        lexer = Lexer(text)
+        lexer.pos, lexer.line, lexer.column = pos, line, column
+        lexer.current_char = text[pos]
+        try:
+            token = lexer.get_next_token()
+        except ValueError:
+            # Invalid number, which may not be over yet
+            if exhausted or lexer.pos < len(text):
+                raise
+            return None, lexer.pos
+        if not exhausted and lexer.pos >= len(text):
+            return None, lexer.pos
+        self.line, self.column = lexer.line, lexer.column
+        return token, lexer.pos
@@ -2,6 +2,9 @@ from src.tokens import *
 
 
 class Token:
+    # Programs have a lot of them
+    __slots__ = ("type", "value", "line", "column")
+
     def __init__(self, type, value, line, column):
         self.type = type
         self.value = value
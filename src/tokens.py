@@ -18,6 +18,8 @@ ELIF = "ELIF"
 ELSE = "ELSE"
 RETURN = "RETURN"
 WHILE = "WHILE"
+FOR = "FOR"
+IN = "IN"
 
 # Singles
 PLUS = "PLUS"
@@ -28,6 +30,8 @@ DIV = "DIV"
 INTDIV = "INTDIV"
 LPAREN = "LPAREN"
 RPAREN = "RPAREN"
+LBRACKET = "LBRACKET"
+RBRACKET = "RBRACKET"
 ASSIGN = "ASSIGN"
 PIPE = "PIPE"
 COLON = "COLON"
@@ -43,6 +47,17 @@ NOTEQUAL = "NOTEQUAL"
 SUPEQUAL = "SUPEQUAL"
 INFEQUAL = "INFEQUAL"
 ARROW = "ARROW"
+RANGE = "RANGE"
+
+# Comparison operators, which can be chained (`1 <= x < 6`)
+COMPARISONS = {
+    SUPEQUAL: ">=",
+    INFEQUAL: "<=",
+    SUP: ">",
+    INF: "<",
+    EQUAL: "==",
+    NOTEQUAL: "!=",
+}
 
 # Others
 NEWLINE = "NEWLINE"
@@ -0,0 +1,8 @@
+class NodeVisitor:
+    def visit(self, node):
+        method_name = "visit_" + type(node).__name__
+        visitor = getattr(self, method_name, self.unhandled_visit)
+        return visitor(node)
+
+    def unhandled_visit(self, node):
+        raise Exception("InterpreterError: No visit_{} method".format(type(node).__name__))
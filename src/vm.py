@@ -0,0 +1,342 @@
+from src.builtins import NativeFunction
+from src.compiler import Code, Compiler
+from src.environment import UNSET, Closure, Environment
+from src.exceptions import TypeError
+from src.interpreter import LITERAL_TYPES, Interpreter
+from src.memo import MemoCache
+from src.numarray import NumArray
+from src.opcodes import *
+from src.rope import Rope
+
+
+def operation_error(node):
+    return TypeError(f"Can't do {node.left.token.type} {node.token.value} {node.right.token.type}")
+
+
+class VM(Interpreter):
+    """Stack based virtual machine running the bytecode produced by the Compiler.
+
+    It is an alternative to the tree walking Interpreter (which stays the reference): instead of a Python
+    method call per node, the whole program runs in a single loop. Function calls don't recurse in Python
+    either, the VM keeps its own stack of frames.
+    """
+
+    def run(self, tree):
+        self.prepare(tree)
+        try:
+            self.execute(Compiler().compile(tree))
+        finally:
+            self.output.flush()
+            if self.budget is not None:
+                self.budget.stop()
+
+    def quicken(self, quick, node, left, right):
+        """Specialize the [left type, right type, function, node index] constant of a BINARY_QUICK instruction
+        for the types of `left` and `right`, or raise the error they make."""
+        function = self.operation(node.token.type, left, right)
+        if function is None:
+            raise operation_error(node)
+        quick[0], quick[1], quick[2] = type(left), type(right), function
+
+    def quicken_unary(self, quick, node, value):
+        """Specialize the [operand type, function, node index] constant of a UNARY_QUICK instruction for the
+        type of `value`, or raise the error it makes."""
+        function = self.unary_operation(node.token.type, value)
+        if function is None:
+            raise TypeError(f"Can't do {node.token.value} {value}")
+        quick[0], quick[1] = type(value), function
+
+    def call(self, closure, args):
+        """Call a Huil function from Python (builtins like pmap), in the loop like any other call: it would
+        recurse in Python in the tree walker."""
+        code = Code(f"<call {closure.function.id}>")
+        code.constants = [closure, *args]
+        code.emit(LOAD_CONST, 0)
+        code.emit(SETUP_CALL)
+        for index in range(len(args)):
+            code.emit(LOAD_CONST, index + 1)
+        code.emit(CALL_FUNCTION)
+        code.emit(HALT)
+        previous = self.env
+        try:
+            return self.execute(code)
+        finally:
+            self.env = previous
+
+    def load(self, function):
+        depth = len(function.scopes)
+        super().load(function)
+        Compiler().compile_function(function, depth)
+
+    def execute(self, code):
+        stack = []
+        # Functions being called, while their arguments are evaluated
+        calls = []
+        frames = []
+        instructions = code.instructions
+        constants = code.constants
+        values = self.env.values
+        globals_ = self.globals.values
+        budget = self.budget
+        pc = 0
+
+        while True:
+            opcode = instructions[pc]
+            argument = instructions[pc + 1]
+            pc += 2
+
+            if opcode == LOAD_FAST:
+                stack.append(values[argument])
+
+            elif opcode == LOAD_GLOBAL:
+                value = globals_[argument]
+                if value is UNSET:
+                    raise self.undeclared(argument)
+                stack.append(value)
+
+            elif opcode == LOAD_CONST:
+                stack.append(constants[argument])
+
+            elif opcode == BINARY_UNCHECKED:
+                right = stack.pop()
+                stack[-1] = constants[argument](stack[-1], right)
+
+            elif opcode == BINARY_QUICK:
+                quick = constants[argument]
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not quick[0] or type(right) is not quick[1]:
+                    # Specialized again for the new types
+                    self.quicken(quick, constants[quick[3]], left, right)
+                stack[-1] = quick[2](left, right)
+
+            elif opcode == POP_TOP:
+                stack.pop()
+
+            elif opcode == POP_JUMP_IF_FALSE:
+                if not stack.pop():
+                    pc = argument
+
+            elif opcode == JUMP:
+                # Jumping back is the next iteration of a loop
+                if budget is not None and argument < pc:
+                    budget.step()
+                pc = argument
+
+            elif opcode == FOR_ITER:
+                value = next(stack[-1], None)
+                if value is None:
+                    stack.pop()
+                    pc = argument
+                else:
+                    stack.append(value)
+
+            elif opcode == STORE_FAST:
+                values[argument] = stack.pop()
+
+            elif opcode == STORE_GLOBAL:
+                globals_[argument] = stack.pop()
+
+            elif opcode == LOAD_DEREF:
+                value = self.env.get(*constants[argument])
+                if value is UNSET:
+                    raise self.undeclared(constants[argument][1])
+                stack.append(value)
+
+            elif opcode == STORE_DEREF:
+                self.env.set(*constants[argument], stack.pop())
+
+            elif COMPARE_SUPEQUAL <= opcode <= COMPARE_INFEQUAL or BINARY_ADD <= opcode <= BINARY_MODULO:
+                right = stack.pop()
+                left = stack[-1]
+                # First run of the instruction, it is replaced by one quickened for these operand types
+                quick = [None, None, None, argument]
+                self.quicken(quick, constants[argument], left, right)
+                instructions[pc - 2] = BINARY_QUICK
+                instructions[pc - 1] = len(constants)
+                constants.append(quick)
+                stack[-1] = quick[2](left, right)
+
+            elif opcode == CHECK_BOOL:
+                if type(stack[-1]) != bool:
+                    raise operation_error(constants[argument])
+
+            elif opcode == UNARY_QUICK:
+                quick = constants[argument]
+                value = stack[-1]
+                if type(value) is not quick[0]:
+                    self.quicken_unary(quick, constants[quick[2]], value)
+                stack[-1] = quick[1](value)
+
+            elif UNARY_NOT <= opcode <= UNARY_NEGATIVE:
+                value = stack[-1]
+                # First run of the instruction, it is replaced by one quickened for the operand type
+                quick = [None, None, argument]
+                self.quicken_unary(quick, constants[argument], value)
+                instructions[pc - 2] = UNARY_QUICK
+                instructions[pc - 1] = len(constants)
+                constants.append(quick)
+                stack[-1] = quick[1](value)
+
+            elif opcode == BINARY_SUBSCR:
+                index = stack.pop()
+                value = stack[-1]
+                if type(value) is not NumArray:
+                    raise TypeError(f"Can't index {constants[argument].value.token.type}")
+                stack[-1] = value.get(index)
+
+            elif opcode == BUILD_ARRAY:
+                elements = stack[len(stack) - argument :]
+                del stack[len(stack) - argument :]
+                stack.append(NumArray.of(elements))
+
+            elif opcode == SETUP_CALL:
+                function = stack.pop()
+                calls.append(function)
+                if type(function) is NativeFunction:
+                    pc = argument
+
+            elif opcode == CHECK_ARITY:
+                function = calls[-1].function
+                fn_args_count = len(function.arguments)
+                if fn_args_count > argument:
+                    raise TypeError(f"Missing arguments {function.arguments[fn_args_count-argument-1:]}")
+
+            elif opcode == ARG_GUARD:
+                if argument < len(calls[-1].function.arguments):
+                    pc += 2
+
+            elif opcode == CALL_FUNCTION or opcode == TAIL_CALL:
+                closure = calls.pop()
+                function = closure.function
+                fn_args_count = len(function.arguments)
+                args = stack[-fn_args_count:] if fn_args_count else []
+                if fn_args_count:
+                    del stack[-fn_args_count:]
+
+                memo = None
+                if function.memo is not None:
+                    key = MemoCache.key(args)
+                    if key is not None:
+                        hit, value = function.memo.get(key)
+                        if hit:
+                            if opcode == CALL_FUNCTION:
+                                stack.append(value)
+                                continue
+                            # Returning the result of the call
+                            instructions, constants, pc, self.env, stack_size, pending = frames.pop()
+                            del stack[stack_size:]
+                            if pending is not None:
+                                for cache, key in pending:
+                                    cache.put(key, value)
+                            stack.append(value)
+                            values = self.env.values
+                            continue
+                        memo = (function.memo, key)
+
+                if function.code is None:
+                    self.load(function)
+                env = Environment(function.scope_size, closure.env)
+                env.values[:fn_args_count] = args
+                if opcode == CALL_FUNCTION:
+                    frames.append((instructions, constants, pc, self.env, len(stack), None if memo is None else [memo]))
+                elif memo is not None:
+                    # A tail call replaces the current function and reuses its frame, which also gets the
+                    # result of this call
+                    if frames[-1][5] is None:
+                        frames[-1] = frames[-1][:5] + ([],)
+                    frames[-1][5].append(memo)
+                self.env = env
+                values = env.values
+                instructions = function.code.instructions
+                constants = function.code.constants
+                pc = 0
+                if budget is not None:
+                    budget.enter(len(frames))
+                    budget.step()
+
+            elif opcode == RETURN_VALUE:
+                value = stack.pop()
+                instructions, constants, pc, self.env, stack_size, pending = frames.pop()
+                del stack[stack_size:]
+                if pending is not None:
+                    for cache, key in pending:
+                        cache.put(key, value)
+                stack.append(value)
+                values = self.env.values
+
+            elif opcode == MAKE_FUNCTION:
+                function = constants[argument]
+                values[function.slot] = Closure(function, self.env)
+
+            elif opcode == CALL_NATIVE:
+                native, args_count = constants[argument]
+                if args_count:
+                    args = stack[-args_count:]
+                    del stack[-args_count:]
+                    stack.append(native.call(self, args))
+                else:
+                    stack.append(native.call(self, []))
+
+            elif opcode == CALL_BUILTIN:
+                native = calls.pop()
+                if argument:
+                    args = stack[-argument:]
+                    del stack[-argument:]
+                    stack.append(native.call(self, args))
+                else:
+                    stack.append(native.call(self, []))
+
+            elif opcode == DUP_TOP:
+                stack.append(stack[-1])
+
+            elif opcode == ROT_TWO:
+                stack[-1], stack[-2] = stack[-2], stack[-1]
+
+            elif opcode == ROT_THREE:
+                stack[-1], stack[-2], stack[-3] = stack[-2], stack[-3], stack[-1]
+
+            elif opcode == JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    stack.pop()
+                else:
+                    pc = argument
+
+            elif opcode == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = argument
+                else:
+                    stack.pop()
+
+            elif opcode == MATCH_TABLE:
+                jumps, default = constants[argument]
+                value = stack.pop()
+                if type(value) is Rope:
+                    value = self.flatten(value)
+                pc = jumps.get(value, default) if type(value) in LITERAL_TYPES else default
+
+            elif opcode == FOR_RANGE:
+                end = stack.pop()
+                start = stack[-1]
+                if type(start) is not int or type(end) is not int:
+                    node = constants[argument]
+                    raise TypeError(f"Can't do {node.start.token.type} .. {node.end.token.type}")
+                stack[-1] = iter(range(start, end))
+
+            elif opcode == MATCH_EQUAL:
+                pattern = stack.pop()
+                stack[-1] = pattern == stack[-1]
+
+            elif opcode == HALT:
+                # The result of a call made by `call`
+                return stack[-1] if stack else None
+
+            else:
+                raise Exception(f"VMError: Unknown opcode {opcode}")
+
+
+# Engines by name, as chosen with main.py --engine
+ENGINES = {
+    "tree": Interpreter,
+    "vm": VM,
+}